@@ -0,0 +1,150 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+
+#使用方法：
+# import CoGenAnnotationCache
+# cache = CoGenAnnotationCache.AnnotationCache("res/annotation_cache.sqlite", model_id, max_mb=2048)
+# cached = cache.get_many(sentences)          # {句子: 标注结果}
+# cache.put_many({sentence: result, ...})
+# print(cache.report())
+
+# 缓存被淘汰时，删除到总大小不超过上限的该比例为止，避免每次写入都触发淘汰
+evict_target_ratio = 0.9
+
+
+def normalize_sentence(sentence):
+    '''
+    计算缓存键之前对句子的规范化。标注结果中的词语是原句的子串，
+    因此只去除首尾空白，不做会改变字符的规范化。
+    '''
+    return sentence.strip()
+
+
+def sentence_key(model_id, sentence):
+    '''
+    缓存键：模型标识与规范化后句子的哈希值。
+    '''
+    data = model_id + "\x00" + normalize_sentence(sentence)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+class AnnotationCache:
+    """
+    以句子内容寻址的磁盘标注缓存，保存每个句子的tok/fine、pos/pku和dep结果。
+    缓存保存在sqlite数据库中，可以在多次运行和不同语料库之间共用；
+    总大小超过上限时按最近使用时间淘汰。
+    """
+
+    def __init__(self, path, model_id, max_mb):
+        """
+        :param path: sqlite数据库文件路径。
+        :param model_id: 模型标识，不同模型（或任务）的结果互不混用。
+        :param max_mb: 缓存大小上限（MB）。
+        """
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+
+        self.model_id = model_id
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS annotations ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS annotations_last_used ON annotations (last_used)"
+        )
+        self.conn.commit()
+        self.total_bytes = self.conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM annotations"
+        ).fetchone()[0]
+
+    def get_many(self, sentences):
+        """
+        查询一组句子的缓存结果，返回{句子: 标注结果}，未命中的句子不在其中。
+        """
+        keys = {sentence_key(self.model_id, sentence): sentence for sentence in set(sentences)}
+        found = {}
+        key_list = list(keys)
+        # sqlite对单条语句的参数个数有限制，分批查询
+        for start in range(0, len(key_list), 500):
+            part = key_list[start : start + 500]
+            rows = self.conn.execute(
+                f"SELECT key, value FROM annotations WHERE key IN ({','.join('?' * len(part))})",
+                part,
+            ).fetchall()
+            for key, value in rows:
+                found[keys[key]] = json.loads(value)
+
+        now = time.time()
+        self.conn.executemany(
+            "UPDATE annotations SET last_used = ? WHERE key = ?",
+            [(now, sentence_key(self.model_id, sentence)) for sentence in found],
+        )
+        self.conn.commit()
+
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, results):
+        """
+        写入一组句子的标注结果，results为{句子: 标注结果}。
+        """
+        now = time.time()
+        rows = []
+        for sentence, result in results.items():
+            value = json.dumps(result, ensure_ascii=False)
+            rows.append((sentence_key(self.model_id, sentence), value, len(value.encode("utf-8")), now))
+
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO annotations (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+            rows,
+        )
+        self.conn.commit()
+        # 写入的都是未命中的句子，直接累加大小
+        self.total_bytes += sum(row[2] for row in rows)
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """
+        按最近使用时间从旧到新删除缓存，直到总大小不超过上限的evict_target_ratio。
+        """
+        target = self.max_bytes * evict_target_ratio
+        freed = 0
+        to_delete = []
+        for key, size in self.conn.execute(
+            "SELECT key, size FROM annotations ORDER BY last_used"
+        ):
+            if self.total_bytes - freed <= target:
+                break
+            to_delete.append((key,))
+            freed += size
+
+        self.conn.executemany("DELETE FROM annotations WHERE key = ?", to_delete)
+        self.conn.commit()
+        self.total_bytes -= freed
+
+    def hit_rate(self):
+        """本次运行中去重后句子的缓存命中率。"""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def report(self):
+        """返回缓存使用情况的说明文字。"""
+        return (
+            f"标注缓存：命中{self.hits}句，未命中{self.misses}句，命中率{self.hit_rate():.1%}，"
+            f"缓存大小{self.total_bytes / 1024 / 1024:.1f}MB/{self.max_bytes / 1024 / 1024:.0f}MB"
+        )
+
+    def close(self):
+        self.conn.close()
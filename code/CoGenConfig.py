@@ -16,6 +16,19 @@ noun_pos = {'an', 'n', 'vn'}
 #是否保存性能分析结果
 save_profiler=False
 
+#搭配库与关键词库的保存格式："csv"，或"colib"（列式二进制格式，读取更快，可用CoLibFormat.export_csv导出为csv）
+library_format = "csv"
+#colib格式中每个行组的行数，读取时可根据行组的频次统计跳过整个行组
+colib_row_group_size = 65536
+#读取json语料时后台预读队列中的记录数（文章数）上限，为0时不预读（逐个文件同步读取），网络存储上建议开启
+prefetch_records = 256
+#导出txt和csv时每次格式化并写入的行数
+export_block_rows = 1000000
+#按词语或词语对列表过滤库时，每次读取的行数
+join_chunk_rows = 1000000
+#结果txt的压缩方式：""不压缩，或"gzip"、"bz2"、"xz"（文件名自动追加.gz、.bz2、.xz）
+txt_compression = ""
+
 #-----------------------------------------------------------------------------------------------------------
 #txt to json
 
@@ -25,6 +38,24 @@ rootname_txt2json = r"/home/xt/workplace/hwzt/code/res4code_231127"
 partname_txt2json = "yulu_231128"
 #结果存放文件夹，本环节中一般应与资源存放文件夹类似
 resrootname_txt2json = r"/home/xt/workplace/hwzt/code/res4code_231127"
+#跨文章批量标注时，每次送入模型的一批句子的 最长句子字数×句子数 上限
+batch_token_budget_txt2json = 8192
+#待标注文章累计达到该字数后进行一次批量标注，每个folder1处理完成时也会进行一次
+batch_window_chars_txt2json = 200000
+#字数不少于该值的长文章单独分块标注，不参与跨文章组批
+long_article_chars_txt2json = 100000
+#分块标注时每块的句子数上限
+chunk_max_sentences_txt2json = 512
+#分块标注时每块的字数上限
+chunk_max_chars_txt2json = 20000
+#句子标注缓存（sqlite数据库）的路径，可在多次运行和不同语料库之间共用，为空时不使用缓存
+annotation_cache_path_txt2json = r""
+#句子标注缓存的大小上限（MB），超过时淘汰最久未使用的句子
+annotation_cache_max_mb_txt2json = 2048
+#标注结果的保存形式："json"每篇文章一个缩进的json文件；"jsonl"每行一篇文章的紧凑记录，写入每个folder2结果文件夹中的分片
+output_format_txt2json = "json"
+#jsonl分片的大小上限（MB），为0时每个folder2只有一个分片
+jsonl_shard_mb_txt2json = 0
 #-----------------------------------------------------------------------------------------------------------
 
 
@@ -41,6 +72,10 @@ resrootname_json2csv = r"/home/xt/workplace/hwzt/res/res4code_231127"
 existed_colLib_path_json2csv=r""
 #是否隐藏最底层进度条，当数据量大时建议为true
 hide_pbar3_json2csv = True 
+#并行处理的工作进程数，为1时串行处理
+n_workers_json2csv = 1
+#并行模式下单个任务的最大数据量（MB），超过该大小的文件夹按文章切分为多个任务
+parallel_chunk_mb_json2csv = 64
 
 #-----------------------------------------------------------------------------------------------------------
 
@@ -56,6 +91,12 @@ partname_mergeCoLib = "to_be_merged_1128_onlynn"
 resrootname_mergeCoLib = r"/home/xt/workplace/hwzt/res/res4code_231127"
 #已有搭配库的位置
 existed_colLib_path_json2csv=r""
+#合并方式："memory"在内存中合并；"external"按内存上限分块排序后写入临时顺串，再多路归并，适合超出内存的合并
+merge_mode_mergeCoLib = "memory"
+#external方式的内存上限（MB）
+merge_memory_mb_mergeCoLib = 1024
+#external方式一次归并的最大顺串数，超过时先分组归并为中间顺串
+merge_max_fan_in_mergeCoLib = 64
 #-----------------------------------------------------------------------------------------------------------
 
 
@@ -101,8 +142,8 @@ resrootname_ColLibProcessing = r"/home/xt/workplace/hwzt/res/res4code_231105/to_
 need_del=True
 #过滤阈值,大于等于阈值的数据保留
 Freq_n_ColLibProcessing=10
-# 定义邻近搜索范围
-search_index_ColLibProcessing= 60
+#分块读取搭配库时每块的行数，读取时即过滤并合并，内存占用取决于过滤后的结果大小
+chunk_rows_ColLibProcessing = 1000000
 #搭配与词性黑名单
 CoLib_exclude_dep_ColLibProcessing={"punct","mark","etc","discourse","aux:asp","aux:ba","nmod:poss","cop"}
 CoLib_exclude_pos_ColLibProcessing={"nr","ns","w","t"}
@@ -125,4 +166,34 @@ resrootname_WFLibProcessing = r"/home/xt/workplace/hwzt/res/res4code_231105/word
 Freq_n_WFLibProcessing=[40,55,69,100]
 #词性黑名单(人名，地名，机构团体，标点符号，时间)
 WFLib_exclude_pos_WFLibProcessing={"nr","ns","nt","w","t"}
-#-----------------------------------------------------------------------------------------------------------
\ No newline at end of file
+#拼音缓存（sqlite数据库）的路径，保存词语的拼音排序键，可在多次运行之间共用，为空时不使用缓存
+pinyin_cache_path_WFLibProcessing = r""
+#-----------------------------------------------------------------------------------------------------------
+
+
+
+#-----------------------------------------------------------------------------------------------------------
+#搭配查询索引
+
+#搭配库文件路径（csv或colib格式）
+library_path_CoLibIndex = r""
+#索引保存路径，应以.coidx结尾
+index_path_CoLibIndex = r""
+#-----------------------------------------------------------------------------------------------------------
+
+
+#-----------------------------------------------------------------------------------------------------------
+#本地查询服务
+
+#搭配查询索引（.coidx）路径，为空时不提供搭配查询
+colib_index_path_CoLibServer = r""
+#搭配库路径（csv或colib格式），索引不存在时启动前先由该搭配库建立索引，为空时不建立
+colib_library_path_CoLibServer = r""
+#关键词库路径（csv或colib格式），为空时不提供关键词查询
+keyword_library_path_CoLibServer = r""
+#服务地址与端口，默认只允许本机访问
+host_CoLibServer = "127.0.0.1"
+port_CoLibServer = 8765
+#查询结果LRU缓存的最大条目数，为0时不缓存
+cache_size_CoLibServer = 100000
+#-----------------------------------------------------------------------------------------------------------
@@ -0,0 +1,329 @@
+import os
+import json
+import time
+import queue
+import threading
+from collections import deque
+import CoGenConfig as myconfig
+
+#使用方法：
+# import CoGenCorpusIO
+# for article_name, article in CoGenCorpusIO.iter_articles(folder2_path, os.listdir(folder2_path)):
+#     ...
+# writer = CoGenCorpusIO.JsonlShardWriter(json_folder_2, shard_bytes=64 * 1024 * 1024)
+# writer.write(article_file, article_result)
+# writer.close()
+# reader = CoGenCorpusIO.PrefetchReader(depth=256)
+# reader.schedule([(folder2_path, file_list), ...])     # 按之后读取的顺序登记全部文件夹
+# for article_name, article in reader.iter_articles(folder2_path, file_list):
+#     ...
+# print(reader.report())
+# reader.close()
+
+# 标注结果的两种保存形式：
+#   .json   每篇文章一个文件
+#   .jsonl  每个分片一个文件，每行是一篇文章的紧凑json记录，记录中的"article"为文章文件名
+json_suffix = ".json"
+jsonl_suffix = ".jsonl"
+# jsonl记录中保存文章文件名的键
+article_key = "article"
+# 结果文件夹中的全部文章都已成功保存时写入的完成标记
+done_marker = ".done"
+# 写入过程中的临时文件后缀，完成后重命名为正式文件
+temp_suffix = ".tmp"
+
+
+def is_article_file(name):
+    """判断文件名是否为标注结果文件（json或jsonl）。"""
+    return name.endswith(json_suffix) or name.endswith(jsonl_suffix)
+
+
+def is_internal_file(name):
+    """判断文件名是否为完成标记或中断时留下的临时文件，读取时直接忽略。"""
+    return name == done_marker or name.endswith(temp_suffix)
+
+
+def is_folder_done(folder):
+    """判断结果文件夹是否带有完成标记。"""
+    return os.path.exists(os.path.join(folder, done_marker))
+
+
+def mark_folder_done(folder):
+    """为结果文件夹写入完成标记。"""
+    open(os.path.join(folder, done_marker), "w").close()
+
+
+def read_records(folder_path, file_name):
+    """
+    读取一个标注结果文件，逐篇返回("article", 文章名, 文章内容)，出错时返回("error", 出错说明, None)。
+    jsonl分片按行流式读取，不会一次读入整个分片。
+    """
+    if is_internal_file(file_name):
+        return
+    if not is_article_file(file_name):
+        yield "error", f"警告：文件 '{file_name}' 不是json或jsonl格式，已跳过。", None
+        return
+
+    file_path = os.path.join(folder_path, file_name)
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            if file_name.endswith(json_suffix):
+                article = json.load(f)
+                yield "article", file_name, article
+                return
+
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    article = json.loads(line)
+                except ValueError as e:
+                    yield "error", f"错误：读取文件 '{file_name}' 第{line_no}行时出现问题。{str(e)}", None
+                    continue
+                yield "article", article.pop(article_key, f"{file_name}:{line_no}"), article
+    except MemoryError:
+        yield "error", f"内存错误：读取文件 '{file_name}' 时内存不足。", None
+    except Exception as e:
+        yield "error", f"错误：读取文件 '{file_name}' 时出现问题。{str(e)}", None
+
+
+def iter_articles(folder_path, file_list):
+    """
+    按file_list的顺序依次读取文件夹中的标注结果，逐篇返回(文章名, 文章内容)。
+    读取出错的文章会被跳过并输出出错说明。
+    """
+    for file_name in file_list:
+        for kind, name, article in read_records(folder_path, file_name):
+            if kind == "error":
+                print(name)
+                continue
+            yield name, article
+
+
+class PrefetchReader:
+    """
+    后台预读的标注结果读取器：一个后台线程按schedule登记的顺序连续读取各文件夹中的文件，
+    将解码后的记录逐条放入容量为depth条记录的有界队列，读完一个文件夹后直接读取下一个，不在文件夹之间停顿。
+    jsonl分片按行流式读取，内存占用取决于队列中的记录数，与文件大小无关。
+    按file_list的顺序返回文章，出错说明也按原顺序输出。
+    一次运行共用一个读取器，统计信息可用于调整预读深度。
+    """
+
+    # 队列中标记一个文件夹读取结束的记录
+    end_record = ("end", None, None)
+
+    def __init__(self, depth):
+        self.depth = max(1, depth)
+        self.queue = queue.Queue(maxsize=self.depth)
+        # 已登记、尚未开始读取的(文件夹路径, 文件列表)
+        self.plan = deque()
+        self.stop = threading.Event()
+        self.thread = None
+        # 读取的记录数、取记录的次数与取记录时队列中已有的记录数之和、等待预读结果的次数与时间
+        self.records = 0
+        self.gets = 0
+        self.depth_total = 0
+        self.stalls = 0
+        self.stall_seconds = 0.0
+
+    def schedule(self, units):
+        """
+        登记之后将依次读取的(文件夹路径, 文件列表)，并启动后台线程按顺序预读。一个读取器只登记一次。
+        """
+        units = [(folder_path, list(file_list)) for folder_path, file_list in units]
+        self.plan.extend(units)
+        self.thread = threading.Thread(target=self.produce, args=(units,), daemon=True)
+        self.thread.start()
+
+    def put(self, record):
+        """队列已满时等待，读取器关闭时放弃并返回False。"""
+        while not self.stop.is_set():
+            try:
+                self.queue.put(record, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce(self, units):
+        """后台线程：依次读取各文件夹中的文件，每个文件夹读完后放入结束标记。"""
+        try:
+            for folder_path, file_list in units:
+                for file_name in file_list:
+                    for record in read_records(folder_path, file_name):
+                        if not self.put(record):
+                            return
+                if not self.put(self.end_record):
+                    return
+        except BaseException as e:
+            self.put(("fatal", e, None))
+
+    def get(self):
+        """从队列中取出一条记录，队列为空时等待并记录等待时间。"""
+        self.gets += 1
+        self.depth_total += self.queue.qsize()
+        try:
+            record = self.queue.get_nowait()
+        except queue.Empty:
+            start = time.perf_counter()
+            record = self.queue.get()
+            self.stall_seconds += time.perf_counter() - start
+            self.stalls += 1
+        if record[0] == "fatal":
+            self.stop.set()
+            raise record[1]
+        return record
+
+    def iter_articles(self, folder_path, file_list):
+        """
+        与iter_articles相同。文件夹与文件列表是下一个已登记的单元时从预读队列中读取，否则同步读取。
+        """
+        if not self.plan or self.plan[0] != (folder_path, list(file_list)):
+            yield from iter_articles(folder_path, file_list)
+            return
+        self.plan.popleft()
+
+        finished = False
+        try:
+            while True:
+                kind, name, article = self.get()
+                if kind == "end":
+                    finished = True
+                    return
+                self.records += 1
+                if kind == "error":
+                    print(name)
+                    continue
+                yield name, article
+        finally:
+            # 提前结束时跳过本文件夹剩余的记录，保证下一个文件夹从正确的位置开始读取
+            while not finished and not self.stop.is_set():
+                finished = self.get()[0] == "end"
+
+    def stats(self):
+        """返回读取统计：记录数、等待次数、等待时间（秒）和取记录时的平均队列深度。"""
+        return {
+            "records": self.records,
+            "stalls": self.stalls,
+            "stall_seconds": self.stall_seconds,
+            "mean_queue_depth": self.depth_total / self.gets if self.gets else 0.0,
+        }
+
+    def report(self):
+        """返回读取统计的说明文字。"""
+        stats = self.stats()
+        return (
+            f"预读：共读取{stats['records']}条记录，等待{stats['stalls']}次，"
+            f"共等待{stats['stall_seconds']:.2f}秒，平均队列深度{stats['mean_queue_depth']:.1f}/{self.depth}"
+        )
+
+    def close(self):
+        self.stop.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+
+def open_articles(folder_path, file_list, reader=None):
+    """
+    读取文件夹中的标注结果，reader为PrefetchReader时使用后台预读，为None时同步读取。
+    """
+    if reader is not None:
+        return reader.iter_articles(folder_path, file_list)
+    return iter_articles(folder_path, file_list)
+
+
+def make_reader():
+    """
+    根据配置文件创建读取器：prefetch_records大于0时返回PrefetchReader，否则返回None（同步读取）。
+    创建后需调用schedule登记之后读取的文件夹。
+    """
+    if myconfig.prefetch_records > 0:
+        return PrefetchReader(myconfig.prefetch_records)
+    return None
+
+
+def write_json_atomic(file_path, data):
+    """先写入临时文件再重命名，中断时不会留下不完整的json文件。"""
+    temp_path = file_path + temp_suffix
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=4)
+    os.replace(temp_path, file_path)
+
+
+def shard_index(file_name):
+    """返回jsonl分片文件名中的序号，不是分片时返回None。"""
+    if file_name.startswith("part-") and file_name.endswith(jsonl_suffix):
+        number = file_name[len("part-") : -len(jsonl_suffix)]
+        if number.isdigit():
+            return int(number)
+    return None
+
+
+def scan_jsonl_shards(folder):
+    """
+    读取文件夹中已有的jsonl分片，返回(已完整写入的文章名集合, 下一个分片的序号)。
+    分片只会追加写入，中断时末尾可能留下不完整的记录，这部分会被截掉，对应的文章需要重新标注。
+    """
+    names = set()
+    next_index = 0
+    for file_name in sorted(os.listdir(folder)):
+        index = shard_index(file_name)
+        if index is None:
+            continue
+        next_index = max(next_index, index + 1)
+
+        shard_path = os.path.join(folder, file_name)
+        valid_bytes = 0
+        with open(shard_path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                names.add(record.get(article_key))
+                valid_bytes += len(line)
+        if valid_bytes < os.path.getsize(shard_path):
+            with open(shard_path, "r+b") as f:
+                f.truncate(valid_bytes)
+    return names, next_index
+
+
+class JsonlShardWriter:
+    """
+    将文章的标注结果以紧凑的json行依次写入文件夹中的分片 part-00000.jsonl、part-00001.jsonl……
+    shard_bytes大于0时，分片超过该大小后换用新的分片；为0时整个文件夹只有一个分片。
+    继续之前中断的处理时，从start_index开始使用新的分片，不改动已有分片。
+    """
+
+    def __init__(self, folder, shard_bytes=0, start_index=0):
+        self.folder = folder
+        self.shard_bytes = shard_bytes
+        self.shard_index = start_index
+        self.shard_size = 0
+        self.file = None
+
+    def write(self, article_name, article_result):
+        record = {article_key: article_name}
+        record.update(article_result)
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        data = line.encode("utf-8")
+
+        if self.file is not None and self.shard_bytes and self.shard_size + len(data) > self.shard_bytes:
+            self.file.close()
+            self.file = None
+            self.shard_index += 1
+        if self.file is None:
+            shard_path = os.path.join(self.folder, f"part-{self.shard_index:05d}{jsonl_suffix}")
+            self.file = open(shard_path, "wb")
+            self.shard_size = 0
+
+        self.file.write(data)
+        self.shard_size += len(data)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -0,0 +1,123 @@
+import os
+import bz2
+import gzip
+import lzma
+import pandas as pd
+import CoGenConfig as myconfig
+
+#使用方法：
+# import CoGenExport
+# CoGenExport.write_txt(df, "res/result.txt", ["词语1", "词语2", "搭配频次"], [" ", ":"])    # 每行"词语1 词语2:搭配频次"
+# CoGenExport.write_csv(df, "res/library.csv", sort_by="搭配频次", ascending=False)
+# CoGenExport.write_csv(CoLibFormat.iter_library(path, 1000000), "res/library.csv")       # 逐块导出
+# CoGenExport.write_lines(words, "res/words.txt", compression="gzip")                       # 保存为res/words.txt.gz
+# 所有函数都先写入临时文件再重命名，返回实际保存的文件路径。
+
+# 支持的压缩方式及文件名后缀
+compression_suffixes = {"gzip": ".gz", "bz2": ".bz2", "xz": ".xz"}
+# 写入文件时的缓冲区大小
+buffer_bytes = 1 << 22
+
+
+def output_path(path, compression=None):
+    """返回按压缩方式追加后缀后的保存路径，compression为None或""时不压缩。"""
+    if not compression:
+        return path
+    if compression not in compression_suffixes:
+        raise ValueError(f"不支持的压缩方式：{compression}")
+    suffix = compression_suffixes[compression]
+    return path if path.endswith(suffix) else path + suffix
+
+
+def open_text(path, compression=None, encoding="utf-8"):
+    """以文本方式打开待写入的文件（可选压缩），使用较大的写入缓冲区。"""
+    if compression == "gzip":
+        return gzip.open(path, "wt", encoding=encoding, newline="")
+    if compression == "bz2":
+        return bz2.open(path, "wt", encoding=encoding, newline="")
+    if compression == "xz":
+        return lzma.open(path, "wt", encoding=encoding, newline="")
+    return open(path, "w", encoding=encoding, newline="", buffering=buffer_bytes)
+
+
+def iter_blocks(data, block_rows=None, sort_by=None, ascending=True):
+    """
+    将dataframe或dataframe块的迭代器切分为不超过block_rows行的块。
+    sort_by不为None时先排序，只支持dataframe；块的迭代器需要调用方保证顺序。
+    """
+    if block_rows is None:
+        block_rows = myconfig.export_block_rows
+
+    if not isinstance(data, pd.DataFrame):
+        if sort_by is not None:
+            raise ValueError("按块导出时不能排序，请先排好顺序。")
+        for chunk in data:
+            yield from iter_blocks(chunk, block_rows)
+        return
+
+    if sort_by is not None:
+        data = data.sort_values(by=sort_by, ascending=ascending, kind="stable")
+    # 没有数据时也返回一个空块，保证csv写入表头
+    for start in range(0, max(len(data), 1), block_rows):
+        yield data.iloc[start : start + block_rows]
+
+
+def format_lines(df, columns, separators):
+    """
+    按列拼接每行的文本，等价于逐行 f"{列1}{分隔符1}{列2}{分隔符2}{列3}..."，缺失值输出为"nan"。
+    """
+    lines = df[columns[0]].astype(str).fillna("nan")
+    for separator, column in zip(separators, columns[1:]):
+        lines = lines + separator + df[column].astype(str).fillna("nan")
+    return lines
+
+
+def write_txt(data, path, columns, separators, sort_by=None, ascending=True, compression=None, encoding="utf-8"):
+    """
+    将dataframe（或按顺序给出的块）按 列1 分隔符1 列2 ... 的格式逐行写入txt。
+
+    :param data: dataframe或dataframe块的迭代器。
+    :param path: 保存路径，压缩时自动追加后缀。
+    :param columns: 每行依次输出的列。
+    :param separators: 列之间的分隔符，比columns少一个。
+    :param sort_by: 排序列（可选），为None时按原顺序输出，不排序。
+    :param compression: None、"gzip"、"bz2"或"xz"。
+    """
+    path = output_path(path, compression)
+    with open_text(path + ".tmp", compression, encoding) as f:
+        for block in iter_blocks(data, sort_by=sort_by, ascending=ascending):
+            if len(block):
+                f.write("\n".join(format_lines(block, columns, separators).tolist()))
+                f.write("\n")
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def write_csv(data, path, sort_by=None, ascending=True, compression=None, encoding="utf-8-sig", sep=","):
+    """
+    将dataframe（或按顺序给出的块）写入csv，第一块写入表头。参数含义与write_txt相同。
+    """
+    path = output_path(path, compression)
+    with open_text(path + ".tmp", compression, encoding) as f:
+        header = True
+        for block in iter_blocks(data, sort_by=sort_by, ascending=ascending):
+            block.to_csv(f, index=False, header=header, sep=sep)
+            header = False
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def write_lines(lines, path, compression=None, encoding="utf-8"):
+    """将字符串逐行写入txt，参数含义与write_txt相同。"""
+    path = output_path(path, compression)
+    with open_text(path + ".tmp", compression, encoding) as f:
+        block = []
+        for line in lines:
+            block.append(line)
+            if len(block) >= myconfig.export_block_rows:
+                f.write("\n".join(block) + "\n")
+                block = []
+        if block:
+            f.write("\n".join(block) + "\n")
+    os.replace(path + ".tmp", path)
+    return path
@@ -0,0 +1,164 @@
+import os
+import numpy as np
+import pandas as pd
+import CoGenConfig as myconfig
+import CoLibFormat
+
+#使用方法：
+# import CoGenJoin
+# index = CoGenJoin.pair_index(CoGenJoin.read_pairs("pairs.txt"))          # 按(词语1, 词语2)过滤
+# index = CoGenJoin.word_index(CoGenJoin.read_words("words.txt"), "关键词")  # 按单个词语过滤
+# df = CoGenJoin.filter_library("res/collocationLibrary_xxx.csv", index, mode="include")
+# for chunk in CoGenJoin.iter_filter_library(path, index, mode="exclude"):  # 逐块过滤，可直接交给CoGenExport导出
+#     ...
+
+
+def read_pairs(txt_path, separator="，"):
+    """
+    读取词语对列表，每行为"词语1，词语2"（默认使用中文逗号分隔），空行忽略。
+
+    :return: 列为词语1、词语2的dataframe。
+    """
+    pairs = []
+    with open(txt_path, "r", encoding="utf-8") as txt_file:
+        for line in txt_file:
+            line = line.strip()
+            if not line:
+                continue
+            word1, word2 = line.split(separator)
+            pairs.append((word1, word2))
+    return pd.DataFrame(pairs, columns=["词语1", "词语2"])
+
+
+def read_words(txt_path):
+    """读取词语列表，每行一个词语，空行忽略。"""
+    with open(txt_path, "r", encoding="utf-8") as txt_file:
+        return [line.strip() for line in txt_file if line.strip()]
+
+
+class KeyIndex:
+    """
+    以一个或多个属性列为键的哈希索引，用于判断库中的每一行是否在给定的键列表中。
+    每个属性列的取值先通过哈希表映射为编号，多列的编号再组合为一个int64键，
+    因此每块数据只需对每列做一次哈希查找和一次整数集合查找，不需要逐行调用python函数。
+    """
+
+    def __init__(self, keys, columns):
+        """
+        :param keys: 包含columns各列的dataframe，每行为一个键。
+        :param columns: 作为键的属性列。
+        """
+        self.columns = list(columns)
+        self.values = [pd.Index(keys[column].dropna().unique()) for column in self.columns]
+        sizes = [len(values) for values in self.values]
+        if np.prod([max(size, 1) for size in sizes], dtype=float) >= 2**63:
+            raise ValueError("键的组合过多，无法编码为int64。")
+        self.radix = np.cumprod([1] + sizes[:0:-1])[::-1].astype(np.int64)
+        codes, valid = self.encode(keys)
+        self.codes = np.unique(codes[valid])
+
+    def encode(self, df):
+        """
+        将df中的键编码为int64，返回(编码数组, 是否所有列的取值都在索引中)。
+        """
+        codes = np.zeros(len(df), dtype=np.int64)
+        valid = np.ones(len(df), dtype=bool)
+        for column, values, radix in zip(self.columns, self.values, self.radix):
+            ids = values.get_indexer(df[column])
+            valid &= ids >= 0
+            codes += ids.astype(np.int64) * radix
+        return codes, valid
+
+    def contains(self, df):
+        """返回与df各行对应的布尔数组，表示该行的键是否在索引中。"""
+        codes, valid = self.encode(df)
+        found = np.zeros(len(df), dtype=bool)
+        found[valid] = np.isin(codes[valid], self.codes)
+        return found
+
+
+def pair_index(pairs):
+    """以(词语1, 词语2)为键的索引，pairs为read_pairs返回的dataframe。"""
+    return KeyIndex(pairs, ["词语1", "词语2"])
+
+
+def word_index(words, column):
+    """以单个属性列（如词语1、关键词）为键的索引，words为词语列表。"""
+    return KeyIndex(pd.DataFrame({column: list(words)}), [column])
+
+
+def filter_frame(df, index, mode="include"):
+    """
+    按索引过滤dataframe。
+
+    :param index: KeyIndex。
+    :param mode: "include"保留键在索引中的行，"exclude"保留键不在索引中的行。
+    """
+    if mode not in ("include", "exclude"):
+        raise ValueError(f"不支持的过滤方式：{mode}")
+    found = index.contains(df)
+    return df[found if mode == "include" else ~found]
+
+
+def iter_filter_colib(library_path, index, mode, chunk_rows):
+    """
+    列式二进制格式的过滤：字符串池中的每个字符串只做一次哈希查找，得到池编号到索引编号的映射表，
+    之后每块只需对编号数组查表，不需要解码字符串；只有通过过滤的行才会被解码。
+    """
+    meta = CoLibFormat.read_meta(library_path)
+    names = [column["name"] for column in meta["columns"]]
+    pool = CoLibFormat.read_pool(library_path)
+    # 编号-1（缺失值）对应字符串池末尾的缺失值，查表结果为-1
+    lookups = [values.get_indexer(pool).astype(np.int64) for values in index.values]
+    arrays = [
+        np.load(os.path.join(library_path, f"col{i}.npy"), mmap_mode="r") for i in range(len(names))
+    ]
+    key_arrays = [arrays[names.index(column)] for column in index.columns]
+
+    for start in range(0, meta["nrows"], chunk_rows):
+        codes = np.zeros(min(chunk_rows, meta["nrows"] - start), dtype=np.int64)
+        valid = np.ones(len(codes), dtype=bool)
+        for key_array, lookup, radix in zip(key_arrays, lookups, index.radix):
+            ids = lookup[key_array[start : start + chunk_rows]]
+            valid &= ids >= 0
+            codes += ids * radix
+        found = np.zeros(len(codes), dtype=bool)
+        found[valid] = np.isin(codes[valid], index.codes)
+        rows = start + np.flatnonzero(found if mode == "include" else ~found)
+
+        data = {}
+        for column, column_meta, array in zip(names, meta["columns"], arrays):
+            values = np.array(array[rows])
+            data[column] = pool[values] if column_meta["type"] == "str" else values
+        yield pd.DataFrame(data, columns=names)
+
+
+def iter_filter_library(library_path, index, mode="include", chunk_rows=None):
+    """
+    分块读取csv或列式二进制格式的库并按索引过滤，逐块返回过滤后的dataframe。
+    内存占用取决于块大小，与库的大小无关。
+    """
+    if mode not in ("include", "exclude"):
+        raise ValueError(f"不支持的过滤方式：{mode}")
+    if chunk_rows is None:
+        chunk_rows = myconfig.join_chunk_rows
+
+    if library_path.endswith(CoLibFormat.colib_suffix):
+        meta = CoLibFormat.read_meta(library_path)
+        column_types = {column["name"]: column["type"] for column in meta["columns"]}
+        if all(column_types[column] == "str" for column in index.columns):
+            yield from iter_filter_colib(library_path, index, mode, chunk_rows)
+            return
+
+    for chunk in CoLibFormat.iter_library(library_path, chunk_rows):
+        yield filter_frame(chunk, index, mode)
+
+
+def filter_library(library_path, index, mode="include", chunk_rows=None):
+    """
+    分块读取库并按索引过滤，返回过滤后的完整dataframe。参数含义与iter_filter_library相同。
+    """
+    parts = list(iter_filter_library(library_path, index, mode, chunk_rows))
+    if not parts:
+        return CoLibFormat.load_library(library_path)
+    return pd.concat(parts, ignore_index=True)
@@ -0,0 +1,97 @@
+import os
+import sqlite3
+import pypinyin
+from pypinyin import lazy_pinyin
+
+#使用方法：
+# import CoGenPinyinCache
+# cache = CoGenPinyinCache.PinyinCache("res/pinyin_cache.sqlite")
+# keys = cache.keys(words, separator="\x00")          # {词语: 拼音排序键}
+# df["拼音"] = cache.key_column(df["关键词"])
+# print(cache.report())
+# cache.close()
+
+# 保存时各字拼音之间的分隔符，与按lazy_pinyin列表比较的顺序一致
+key_separator = "\x00"
+
+
+class PinyinCache:
+    """
+    词语到拼音排序键的磁盘缓存，保存在sqlite数据库中，可以在多次运行之间共用。
+    第一次查询时才读入全部缓存，之后只为新出现的词语计算拼音并写入数据库。
+    pypinyin版本变化时清空缓存，避免混用不同版本的拼音结果。
+    """
+
+    def __init__(self, path):
+        """
+        :param path: sqlite数据库文件路径。
+        """
+        self.path = path
+        self.conn = None
+        self.table = None
+        self.hits = 0
+        self.misses = 0
+
+    def load(self):
+        """打开数据库并读入全部缓存，只在第一次查询时执行。"""
+        if self.table is not None:
+            return
+        folder = os.path.dirname(self.path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS pinyin (word TEXT PRIMARY KEY, pinyin TEXT NOT NULL)"
+        )
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'pypinyin_version'").fetchone()
+        if row is None or row[0] != pypinyin.__version__:
+            self.conn.execute("DELETE FROM pinyin")
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('pypinyin_version', ?)",
+                (pypinyin.__version__,),
+            )
+        self.conn.commit()
+        self.table = dict(self.conn.execute("SELECT word, pinyin FROM pinyin"))
+
+    def get_many(self, words):
+        """
+        返回{词语: 以key_separator连接的各字拼音}，未缓存的词语计算拼音后写入缓存。
+        """
+        self.load()
+        words = set(words)
+        new_words = [word for word in words if word not in self.table]
+        if new_words:
+            rows = [(word, key_separator.join(lazy_pinyin(word))) for word in new_words]
+            self.conn.executemany("INSERT OR REPLACE INTO pinyin (word, pinyin) VALUES (?, ?)", rows)
+            self.conn.commit()
+            self.table.update(rows)
+
+        self.hits += len(words) - len(new_words)
+        self.misses += len(new_words)
+        return {word: self.table[word] for word in words}
+
+    def keys(self, words, separator=key_separator):
+        """
+        批量返回{词语: 拼音排序键}，排序键为各字拼音以separator连接。
+        """
+        values = self.get_many(words)
+        if separator == key_separator:
+            return values
+        return {word: value.replace(key_separator, separator) for word, value in values.items()}
+
+    def key_column(self, column, separator=key_separator):
+        """返回与column（词语的Series）一一对应的拼音排序键Series。"""
+        return column.map(self.keys(column.unique(), separator))
+
+    def report(self):
+        """返回缓存使用情况的说明文字。"""
+        total = self.hits + self.misses
+        hit_rate = self.hits / total if total else 0.0
+        return f"拼音缓存：命中{self.hits}个词语，新增{self.misses}个词语，命中率{hit_rate:.1%}"
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
@@ -0,0 +1,102 @@
+import re
+
+#使用方法：
+# import CoGenSentenceSplit
+# sentences = CoGenSentenceSplit.split_sentence(text)
+# article_sentences = CoGenSentenceSplit.split_sentences(texts)     # 一次处理多篇文章
+# 分句结果与legacy_split_sentence（原custom_split_sentence）完全一致，
+# 一致性检查与速度对比见bench_SentenceSplit.py
+
+# 句子终结符（包括所有空白字符）、六个连续句点构成的省略号、两个连续省略号字符构成的省略号，
+# 连续出现的分隔符一次匹配，切分后不会产生空串以外的差别
+_RE_SEPARATORS = re.compile(r"(?:[。！!？?,，:：；;\s]|\.{6}|…{2})+")
+# 还原缩写时使用的分隔符
+_SEPARATOR = r"@"
+# 用于还原缩写的正则表达式
+_UNDO_AB_SENIOR = re.compile(r"([A-Z][a-z]{1,2}\.)" + _SEPARATOR + r"(\w)", re.UNICODE)
+_UNDO_AB_ACRONYM = re.compile(r"(\.[a-zA-Z]\.)" + _SEPARATOR + r"(\w)", re.UNICODE)
+_UNDO_REPLACEMENT = r"\1 \2"
+
+
+def split_sentence(text, best=True):
+    '''
+    自定义分句，句子终结符([。！!？?,，:：；;]|\s)、"......"和"……"处断开，返回句子列表。
+
+    原实现先将终结符替换为换行符，再对每一段做缩写识别和英文分句。
+    由于空白字符都已被替换，缩写规则（需要空白）不会匹配，英文分句也总是把整段作为一个句子，
+    实际效果只有还原缩写的两次替换：段中原本就含有"@"时，"Mr.@J"会被还原为"Mr. J"。
+    因此这里只扫描一次文本，不含"@"的段（包括全部纯中文的段）直接返回。
+    '''
+    sentences = _RE_SEPARATORS.split(text)
+    if not best:
+        return [sentence for sentence in sentences if sentence]
+
+    result = []
+    for sentence in sentences:
+        if not sentence:
+            continue
+        if _SEPARATOR in sentence:
+            sentence = _UNDO_AB_SENIOR.sub(_UNDO_REPLACEMENT, sentence)
+            sentence = _UNDO_AB_ACRONYM.sub(_UNDO_REPLACEMENT, sentence)
+        result.append(sentence)
+    return result
+
+
+def split_sentences(texts, best=True):
+    '''
+    对多篇文章分句，返回与texts一一对应的句子列表。
+    '''
+    return [split_sentence(text, best) for text in texts]
+
+
+# 以下为原分句实现，仅用于一致性检查和速度对比
+
+# 定义一个句子识别的正则表达式，能够找到句尾符号或者行尾
+_RE_SENTENCE = re.compile(r"(\S.+?[.!?])(?=\s+|$)|(\S.+?)(?=[\n]|$)", re.UNICODE)
+# 定义一个匹配缩写的正则表达式，如“Mr.”
+_AB_SENIOR = re.compile(r"([A-Z][a-z]{1,2}\.)\s(\w)", re.UNICODE)
+# 定义一个匹配连续缩写的正则表达式，如“U.S.A.”
+_AB_ACRONYM = re.compile(r"(\.[a-zA-Z]\.)\s(\w)", re.UNICODE)
+
+
+def _replace_with_separator(text, separator, regexs):
+    # 将匹配到的模式替换为分隔符
+    replacement = r"\1" + separator + r"\2"
+    result = text
+    for regex in regexs:
+        result = regex.sub(replacement, result)
+    return result
+
+
+def legacy_split_sentence(text, best=True):
+    '''
+    原custom_split_sentence：将指定句子终结符替换为换行符后逐段分句。
+    句子终结符包括([。！!？?,，:：；;]|\s)
+    '''
+    # 使用正则表达式替换所有的句子终结符为换行符，包括空格
+    text = re.sub(r"([。！!？?,，:：；;]|\s)", r"\n", text)
+    # 对于六个连续句点构成的省略号，替换为换行符
+    text = re.sub(r"(\.{6})", r"\n", text)
+    # 对于两个连续省略号字符构成的省略号，替换为换行符
+    text = re.sub(r"(…{2})", r"\n", text)
+
+    for chunk in text.split("\n"):  # 通过换行符来分割文本
+        chunk = chunk.strip()
+        if not chunk:  # 如果行为空，则忽略
+            continue
+        if not best:  # 如果不需要最佳分割，则直接返回结果
+            yield chunk
+            continue
+        # 处理缩写，防止它们被错误地分割
+        processed = _replace_with_separator(
+            chunk, _SEPARATOR, [_AB_SENIOR, _AB_ACRONYM]
+        )
+        sents = list(_RE_SENTENCE.finditer(processed))  # 查找所有句子
+        if not sents:  # 如果没有找到句子，则直接返回
+            yield chunk
+            continue
+        for sentence in sents:  # 对找到的每个句子，还原缩写后返回
+            sentence = _replace_with_separator(
+                sentence.group(), r" ", [_UNDO_AB_SENIOR, _UNDO_AB_ACRONYM]
+            )
+            yield sentence
@@ -0,0 +1,232 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+import CoGenConfig as myconfig
+
+#使用方法：
+# import CoGenVocab
+# vocab = CoGenVocab.load_vocab(folder)
+# counter = CoGenVocab.IdCounter(vocab, CoGenConfig.partial_columns, "搭配频次")
+
+# 各属性列对应的词表种类
+column_kinds = {
+    "词语1": "words",
+    "词语2": "words",
+    "关键词": "words",
+    "词语1词性": "pos",
+    "词语2词性": "pos",
+    "词性": "pos",
+    "词语间依存关系": "rels",
+}
+
+# 词表文件名，与搭配库、关键词库存放在同一文件夹中
+vocab_filename = "vocab.json"
+
+
+class Vocabulary:
+    """
+    字符串与稠密整数编号之间的双向映射，编号按首次出现的顺序分配。
+    """
+
+    def __init__(self, items=()):
+        self.id_to_item = []
+        self.item_to_id = {}
+        self._decode_array = np.empty(0, dtype=object)
+        for item in items:
+            self.add(item)
+
+    def __len__(self):
+        return len(self.id_to_item)
+
+    def add(self, item):
+        """返回item的编号，不存在时新分配一个。"""
+        item_id = self.item_to_id.get(item)
+        if item_id is None:
+            item_id = len(self.id_to_item)
+            self.item_to_id[item] = item_id
+            self.id_to_item.append(item)
+        return item_id
+
+    def encode(self, values):
+        """
+        将一列字符串编码为int32编号数组，缺失值编码为-1。
+        只对去重后的值查表，因此代价主要取决于不同字符串的个数。
+        """
+        codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+        unique_ids = np.fromiter(
+            (self.add(item) for item in uniques), dtype=np.int32, count=len(uniques)
+        )
+        ids = np.full(len(codes), -1, dtype=np.int32)
+        ids[codes >= 0] = unique_ids[codes[codes >= 0]]
+        return ids
+
+    def decode(self, ids):
+        """将编号数组解码为字符串数组。"""
+        if len(self._decode_array) != len(self.id_to_item):
+            self._decode_array = np.empty(len(self.id_to_item), dtype=object)
+            self._decode_array[:] = self.id_to_item
+        return self._decode_array[np.asarray(ids)]
+
+
+class CoGenVocab:
+    """
+    搭配库与关键词库共用的词表，分别为词语、词性和依存关系分配编号。
+    """
+
+    def __init__(self, words=(), pos=(), rels=()):
+        # 词性与依存关系预先按配置文件中出现的取值编号
+        known_pos = (
+            set(myconfig.wordsLib_need_pos_fine)
+            | myconfig.noun_pos
+            | myconfig.CoLib_exclude_pos_ColLibProcessing
+            | myconfig.WFLib_exclude_pos_WFLibProcessing
+        )
+        known_rels = myconfig.CoLib_exclude_dep_ColLibProcessing | {"compound:nn", "root"}
+
+        self.words = Vocabulary(words)
+        self.pos = Vocabulary(list(pos) + sorted(known_pos))
+        self.rels = Vocabulary(list(rels) + sorted(known_rels))
+
+    def __getitem__(self, kind):
+        return getattr(self, kind)
+
+    def save(self, folder):
+        """将词表保存到folder中。"""
+        file_path = os.path.join(folder, vocab_filename)
+        temp_path = file_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "words": self.words.id_to_item,
+                    "pos": self.pos.id_to_item,
+                    "rels": self.rels.id_to_item,
+                },
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(temp_path, file_path)
+
+
+def load_vocab(folder):
+    """
+    读取folder中已保存的词表，不存在时新建词表。
+    """
+    file_path = os.path.join(folder, vocab_filename)
+    if not os.path.exists(file_path):
+        return CoGenVocab()
+
+    with open(file_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return CoGenVocab(data["words"], data["pos"], data["rels"])
+
+
+class IdCounter:
+    """
+    以int32编号为键的计数器，用于搭配库和关键词库的累加。
+    新数据先追加到缓冲区，缓冲区行数超过已归并的行数时才排序归并，总代价与输入行数近似线性。
+    """
+
+    # 缓冲区归并的最小行数
+    min_compact_rows = 1 << 16
+
+    def __init__(self, vocab, columns, freq_column):
+        """
+        :param vocab: CoGenVocab词表。
+        :param columns: 作为键的属性列。
+        :param freq_column: 频次列名。
+        """
+        self.vocab = vocab
+        self.columns = list(columns)
+        self.freq_column = freq_column
+        self._keys = np.empty((0, len(self.columns)), dtype=np.int32)
+        self._counts = np.empty(0, dtype=np.int64)
+        self._buffer_keys = []
+        self._buffer_counts = []
+        self._buffer_rows = 0
+
+    def __len__(self):
+        self.compact()
+        return len(self._counts)
+
+    def clear(self):
+        """清空计数，保留词表。"""
+        self._keys = np.empty((0, len(self.columns)), dtype=np.int32)
+        self._counts = np.empty(0, dtype=np.int64)
+        self._buffer_keys, self._buffer_counts, self._buffer_rows = [], [], 0
+
+    def add_frame(self, df):
+        """
+        将dataframe累加到计数器中。带有频次列时按频次累加，否则每行计1次。
+        键中含有缺失值的行会被忽略，与groupby的行为一致。
+        """
+        keys = np.column_stack(
+            [self.vocab[column_kinds[column]].encode(df[column]) for column in self.columns]
+        ).astype(np.int32, copy=False).reshape(len(df), len(self.columns))
+        if self.freq_column in df.columns:
+            counts = df[self.freq_column].to_numpy(dtype=np.int64)
+        else:
+            counts = np.ones(len(df), dtype=np.int64)
+
+        valid = (keys >= 0).all(axis=1)
+        if not valid.all():
+            keys, counts = keys[valid], counts[valid]
+        self.add_ids(keys, counts)
+        return self
+
+    def add_ids(self, keys, counts):
+        """将已编码的键和频次追加到缓冲区。"""
+        self._buffer_keys.append(keys)
+        self._buffer_counts.append(counts)
+        self._buffer_rows += len(counts)
+        if self._buffer_rows >= max(len(self._counts), self.min_compact_rows):
+            self.compact()
+
+    def update(self, other):
+        """
+        将另一个计数器累加到本计数器中，两者词表不同时先将编号映射到本词表。
+        """
+        other.compact()
+        keys = other._keys
+        if other.vocab is not self.vocab:
+            keys = keys.copy()
+            for j, column in enumerate(self.columns):
+                kind = column_kinds[column]
+                mapping = self.vocab[kind].encode(other.vocab[kind].id_to_item)
+                keys[:, j] = mapping[keys[:, j]]
+        self.add_ids(keys, other._counts)
+        return self
+
+    def compact(self):
+        """将缓冲区与已归并的数据排序并按键求和。"""
+        if not self._buffer_rows:
+            return
+        keys = np.concatenate([self._keys] + self._buffer_keys)
+        counts = np.concatenate([self._counts] + self._buffer_counts)
+        self._buffer_keys, self._buffer_counts, self._buffer_rows = [], [], 0
+
+        order = np.lexsort(keys.T[::-1])
+        keys, counts = keys[order], counts[order]
+        if len(keys):
+            starts = np.flatnonzero(
+                np.concatenate([[True], (keys[1:] != keys[:-1]).any(axis=1)])
+            )
+            keys, counts = keys[starts], np.add.reduceat(counts, starts)
+        self._keys, self._counts = keys, counts
+
+    def to_frame(self, sort_keys=True):
+        """
+        解码为字符串属性列加频次列的dataframe。
+        sort_keys为True时按属性列的字符串升序排列，与groupby的结果顺序一致。
+        """
+        self.compact()
+        df = pd.DataFrame(
+            {
+                column: self.vocab[column_kinds[column]].decode(self._keys[:, j])
+                for j, column in enumerate(self.columns)
+            }
+        )
+        df[self.freq_column] = self._counts
+        if sort_keys and len(df):
+            df = df.sort_values(by=self.columns, kind="stable", ignore_index=True)
+        return df
@@ -0,0 +1,259 @@
+from tqdm import tqdm
+import os
+from datetime import datetime
+import cProfile
+import gc
+import argparse
+import CoGenConfig as myconfig
+import CoGenVocab
+import CoLibFormat
+import CoGenCorpusIO
+import CollocationGen_v3 as colgen
+import wordFrequencyLibraryGen_v1 as wfgen
+
+# 对json形式的语料只读取一遍，每篇文章同时用于搭配抽取和关键词统计，一次运行同时生成搭配库和关键词库。
+# 结果与分别运行CollocationGen_v3和wordFrequencyLibraryGen_v1一致。
+# 语料与搭配库的位置使用配置文件中json to csv部分的设置，关键词库的位置使用从json中提取关键词库部分的设置。
+
+
+def articleChunkProcess(
+    folder2_path,
+    article_list,
+    collocationCounter,
+    wordFreqCounter,
+    need_pos,
+    hide_pbar3=True,
+    reader=None,
+):
+    '''
+    处理folder2中的一组文章，每篇文章只读取一次，搭配与关键词分别计入两个计数器。
+    reader为后台预读的读取器（可选），为None时同步读取。
+    '''
+    folder2 = os.path.basename(folder2_path)
+
+    # 使用内部进度条处理folder2中的每篇文章，json与jsonl分片都按顺序流式读取
+    pbar3 = tqdm(
+        CoGenCorpusIO.open_articles(folder2_path, article_list, reader),
+        desc=f"正在处理'{folder2}'中的文章",
+        leave=False,
+        mininterval=60,
+        disable=hide_pbar3,
+    )
+    for article_file, article_content in pbar3:
+        colgen.articleProcess(collocationCounter, article_file, article_content)
+        wfgen.articleProcess(wordFreqCounter, article_file, article_content, need_pos)
+
+    return collocationCounter, wordFreqCounter
+
+
+def articleChunkWorker(folder2_path, article_list, need_pos):
+    '''
+    并行模式下工作进程执行的任务：处理一组文章并返回两个部分计数结果，顺序与countCorpus的计数器列表一致。
+    '''
+    return articleChunkProcess(
+        folder2_path,
+        article_list,
+        colgen.newCollocationCounter(),
+        wfgen.newWordFreqCounter(),
+        need_pos,
+    )
+
+
+def saveCheckpoint(
+    collocationCounter,
+    wordFreqCounter,
+    collocation_Library_folder,
+    word_Freq_Library_folder,
+    folder1,
+    journal,
+    units,
+):
+    '''
+    保存关键词库的临时结果和搭配库的增量分片。
+    关键词库的临时结果随增量分片一起记入运行日志，两者都保存成功后本次的单元才算完成。
+    保存成功后清空搭配库的增量计数器，关键词库的计数器为累计计数，不清空。
+
+    :return: 是否保存成功
+    '''
+    wordFreq_checkpoint = wfgen.saveTempLibrary(wordFreqCounter, word_Freq_Library_folder, folder1)
+    if wordFreq_checkpoint is None:
+        return False
+
+    return colgen.saveDeltaShard(
+        collocationCounter,
+        collocation_Library_folder,
+        folder1,
+        journal,
+        units,
+        {"wordFreq_checkpoint": wordFreq_checkpoint},
+    )
+
+
+def corpus_process_and_merge(
+    corpus_of_Json_folder,
+    collocation_Library_folder,
+    existed_coLibrary,
+    word_Freq_Library_folder,
+    existed_wordFreqLibrary,
+    need_pos,
+    n_workers=1,
+    resume=False,
+):
+    '''
+    对多层文件夹的json形式文章只读取一遍，同时生成搭配库和关键词库，注意文件夹层级。
+    每个folder1处理完成后保存搭配库的增量分片和关键词库的临时结果，运行日志存放在搭配库文件夹中。
+    n_workers大于1时使用多进程并行处理。resume为True时读取运行日志，跳过已完成的单元。
+    '''
+    # 检查corpus_of_Json_folder是否存在
+    if not os.path.exists(corpus_of_Json_folder):
+        print(f"错误：指定的文件夹{corpus_of_Json_folder}不存在。")
+        return
+
+    # 检查结果文件夹是否存在，不存在则创建
+    for folder in [collocation_Library_folder, word_Freq_Library_folder]:
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+
+    # 读取运行日志，继续运行时沿用日志中的已有库、分片与关键词库的临时结果
+    journal = colgen.readJournal(collocation_Library_folder) if resume else None
+    if resume and journal is None:
+        print("未找到运行日志，从头开始处理。")
+    if journal is not None:
+        if journal["corpus"] != os.path.abspath(corpus_of_Json_folder):
+            print(f"错误：运行日志对应的语料库为{journal['corpus']}，与当前语料库不一致。")
+            return
+        if "wordFreq_checkpoint" not in journal:
+            print("错误：运行日志不是由本程序生成的，无法继续关键词库的统计。")
+            return
+        print(f"从运行日志继续，已完成{len(journal['done_units'])}个单元。")
+        colgen.removeStrayShards(collocation_Library_folder, journal)
+    else:
+        journal = {
+            "corpus": os.path.abspath(corpus_of_Json_folder),
+            "existed_coLibrary": existed_coLibrary,
+            "shards": [],
+            "done_units": [],
+            "existed_wordFreqLibrary": existed_wordFreqLibrary,
+            "wordFreq_checkpoint": None,
+        }
+        colgen.writeJournal(collocation_Library_folder, journal)
+
+    # 搭配库使用增量计数器，关键词库使用累计计数器
+    collocationCounter = colgen.newCollocationCounter(
+        CoGenVocab.load_vocab(collocation_Library_folder)
+    )
+    wordFreqCounter = wfgen.newWordFreqCounter(CoGenVocab.load_vocab(word_Freq_Library_folder))
+    if journal["wordFreq_checkpoint"] is not None:
+        try:
+            wordFreqCounter.add_frame(CoLibFormat.load_library(journal["wordFreq_checkpoint"]))
+        except Exception as e:
+            print(f"错误：读取关键词库的临时结果{journal['wordFreq_checkpoint']}时出现问题，无法继续。{str(e)}")
+            return
+    else:
+        wfgen.loadExistedLibrary(wordFreqCounter, journal["existed_wordFreqLibrary"])
+
+    def chunkProcess(folder2_path, article_list, reader):
+        articleChunkProcess(
+            folder2_path,
+            article_list,
+            collocationCounter,
+            wordFreqCounter,
+            need_pos,
+            myconfig.hide_pbar3_json2csv,
+            reader,
+        )
+
+    def checkpoint(folder1, units):
+        return saveCheckpoint(
+            collocationCounter,
+            wordFreqCounter,
+            collocation_Library_folder,
+            word_Freq_Library_folder,
+            folder1,
+            journal,
+            units,
+        )
+
+    if not colgen.countCorpus(
+        corpus_of_Json_folder,
+        journal,
+        [collocationCounter, wordFreqCounter],
+        chunkProcess,
+        checkpoint,
+        n_workers,
+        articleChunkWorker,
+        (need_pos,),
+    ):
+        return
+
+    # 合并已有搭配库与全部增量分片
+    print(f"开始合并并保存所有的搭配库处理结果")
+    collocationLibrary_new = colgen.compactShards(
+        collocation_Library_folder, journal, collocationCounter.vocab
+    )
+    # 语料文件夹名
+    partname = myconfig.partname_json2csv
+    # 按照搭配频次降序排序后保存
+    CoLibFormat.save_library(
+        collocationLibrary_new,
+        os.path.join(collocation_Library_folder, f"collocationLibrary_{partname}"),
+        sort_by="搭配频次",
+    )
+    collocationCounter.vocab.save(collocation_Library_folder)
+    collocationLibrary_new = None
+    gc.collect()
+
+    # 保存关键词库
+    wfgen.saveLibrary(wordFreqCounter, word_Freq_Library_folder)
+
+
+def main():
+    # 语料文件夹名
+    partname = myconfig.partname_json2csv
+
+    # 语料库存放文件夹，注意语料库内部的文件夹结构
+    yuliaoku = os.path.join(myconfig.rootname_json2csv, partname)
+    # 生成的搭配库存放文件夹
+    dapeikujieguo = os.path.join(myconfig.resrootname_json2csv, partname)
+    # 已有的搭配库存储位置
+    yiyoudapeiku = myconfig.existed_colLib_path_json2csv
+    # 生成的关键词库存放文件夹
+    guanjianciku = os.path.join(myconfig.resrootname_json2words, myconfig.partname_json2words)
+    # 已有的关键词库存储位置
+    yiyouguanjianciku = myconfig.existed_colLib_path_json2words
+
+    parser = argparse.ArgumentParser(description="从json格式的语料同时生成搭配库和关键词库")
+    parser.add_argument(
+        "--resume", action="store_true", help="读取运行日志，从上次中断处继续处理"
+    )
+    args = parser.parse_args()
+
+    # 性能检测模块前置
+    profiler = cProfile.Profile()
+    profiler.enable()
+
+    print("")
+    print(f"{partname}开始处理。已有搭配库为：[{yiyoudapeiku}]，已有关键词库为：[{yiyouguanjianciku}]")
+    corpus_process_and_merge(
+        yuliaoku,
+        dapeikujieguo,
+        yiyoudapeiku,
+        guanjianciku,
+        yiyouguanjianciku,
+        myconfig.wordsLib_need_pos_fine,
+        myconfig.n_workers_json2csv,
+        args.resume,
+    )
+
+    # 性能检测模块后置
+    # 时间戳
+    timestamp = datetime.now().strftime("%m%d%H%M")
+    profiler.disable()
+    #是否保存性能分析结果
+    saveTag=myconfig.save_profiler
+    if(saveTag):
+        profiler.dump_stats(f"performance_analysis_4_json2libs_{partname}_{timestamp}.prof")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,460 @@
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+import CoGenConfig as myconfig
+import CoGenExport
+
+#使用方法：
+# import CoLibFormat
+# CoLibFormat.save_library(df, "res/collocationLibrary_xxx", sort_by="搭配频次")
+# df = CoLibFormat.load_library("res/collocationLibrary_xxx.colib", min_freq=10, freq_column="搭配频次")
+
+# 列式二进制格式（.colib）是一个文件夹，包含：
+#   meta.json        行数、属性列及类型、排序方式、行组大小与行组统计信息
+#   pool.bin         所有字符串列共用的字符串池，utf-8编码后依次拼接
+#   pool_offsets.npy 字符串池中每个字符串的字节偏移，长度为字符串个数+1
+#   col{i}.npy       第i列的数据，字符串列保存为字符串池中的int32编号
+# 所有npy文件都可以用内存映射方式读取。
+
+colib_suffix = ".colib"
+csv_suffix = ".csv"
+format_version = 1
+
+
+def is_library_file(name):
+    """判断文件名是否为支持的库文件（csv或colib）。"""
+    return name.endswith(csv_suffix) or name.endswith(colib_suffix)
+
+
+def write_library(df, path, sort_by=None, ascending=False, row_group_size=None):
+    """
+    将dataframe保存为列式二进制格式。
+
+    :param df: 要保存的dataframe。
+    :param path: 保存路径，应以.colib结尾。
+    :param sort_by: 排序列（可选），为None时保持原有顺序。
+    :param ascending: 是否升序排序。
+    :param row_group_size: 行组大小，默认使用配置文件中的值。
+    """
+    if row_group_size is None:
+        row_group_size = myconfig.colib_row_group_size
+    if sort_by is not None:
+        df = df.sort_values(by=sort_by, ascending=ascending, kind="stable")
+
+    # 先写入临时文件夹，完成后再替换，避免中断时留下不完整的库
+    temp_path = path + ".tmp"
+    if os.path.exists(temp_path):
+        shutil.rmtree(temp_path)
+    os.makedirs(temp_path)
+
+    string_columns = [
+        column for column in df.columns if not pd.api.types.is_numeric_dtype(df[column])
+    ]
+    # 所有字符串列共用一个字符串池
+    if string_columns:
+        codes, pool = pd.factorize(
+            np.concatenate([df[column].to_numpy(dtype=object) for column in string_columns])
+        )
+        codes = codes.astype(np.int32).reshape(len(string_columns), len(df))
+    else:
+        codes, pool = np.empty((0, len(df)), dtype=np.int32), []
+
+    encoded_pool = [str(item).encode("utf-8") for item in pool]
+    offsets = np.zeros(len(encoded_pool) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(item) for item in encoded_pool])
+    with open(os.path.join(temp_path, "pool.bin"), "wb") as f:
+        f.write(b"".join(encoded_pool))
+    np.save(os.path.join(temp_path, "pool_offsets.npy"), offsets)
+
+    columns_meta = []
+    stats = {}
+    n_groups = (len(df) + row_group_size - 1) // row_group_size
+    group_starts = np.arange(n_groups) * row_group_size
+    for i, column in enumerate(df.columns):
+        if column in string_columns:
+            data = codes[string_columns.index(column)]
+            columns_meta.append({"name": column, "type": "str"})
+        else:
+            data = df[column].to_numpy()
+            columns_meta.append({"name": column, "type": data.dtype.str})
+            # 数值列记录每个行组的最小值和最大值，用于读取时跳过整个行组
+            if n_groups and data.dtype.kind in "iuf":
+                stats[column] = {
+                    "min": np.minimum.reduceat(data, group_starts).tolist(),
+                    "max": np.maximum.reduceat(data, group_starts).tolist(),
+                }
+        np.save(os.path.join(temp_path, f"col{i}.npy"), np.ascontiguousarray(data))
+
+    meta = {
+        "version": format_version,
+        "nrows": len(df),
+        "columns": columns_meta,
+        "sort_by": sort_by,
+        "ascending": ascending,
+        "row_group_size": row_group_size,
+        "stats": stats,
+    }
+    with open(os.path.join(temp_path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=4)
+
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.replace(temp_path, path)
+
+
+def read_meta(path):
+    """读取列式二进制库的元信息。"""
+    with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def read_pool(path):
+    """
+    读取整个字符串池并解码为字符串数组，需要对池中的全部字符串建立索引时使用（如CoGenJoin的过滤）。
+    会将pool.bin整体读入内存并解码所有字符串；只需解码部分行时请使用StringPool。
+    数组末尾额外放置一个缺失值，使编号-1（写入时的缺失值）解码为缺失值。
+    """
+    offsets = np.load(os.path.join(path, "pool_offsets.npy"), mmap_mode="r")
+    pool = np.empty(len(offsets), dtype=object)
+    pool[-1] = np.nan
+    if len(pool) > 1:
+        blob = np.memmap(os.path.join(path, "pool.bin"), dtype=np.uint8, mode="r")
+        blob = blob.tobytes()
+        pool[:-1] = [
+            blob[start:end].decode("utf-8") for start, end in zip(offsets[:-1], offsets[1:])
+        ]
+    return pool
+
+
+class StringPool:
+    """
+    以内存映射方式打开的字符串池，只解码给定编号用到的字符串，内存占用与用到的字符串数有关，与池的大小无关。
+    """
+
+    def __init__(self, path):
+        self.offsets = np.load(os.path.join(path, "pool_offsets.npy"), mmap_mode="r")
+        self.blob = memoryview(b"")
+        # 空文件无法内存映射（字符串池为空或只有空字符串）
+        if len(self.offsets) > 1 and self.offsets[-1] > 0:
+            self.blob = memoryview(
+                np.asarray(np.memmap(os.path.join(path, "pool.bin"), dtype=np.uint8, mode="r"))
+            )
+
+    def decode(self, codes):
+        """将编号数组解码为字符串数组，编号-1解码为缺失值；每个不同的编号只解码一次。"""
+        unique, inverse = np.unique(np.asarray(codes), return_inverse=True)
+        values = np.empty(len(unique), dtype=object)
+        valid = unique >= 0
+        values[~valid] = np.nan
+        if valid.any():
+            starts = self.offsets[unique[valid]].tolist()
+            ends = self.offsets[unique[valid] + 1].tolist()
+            values[valid] = [
+                self.blob[start:end].tobytes().decode("utf-8") for start, end in zip(starts, ends)
+            ]
+        return values[inverse.reshape(-1)]
+
+
+def read_library(path, columns=None, min_freq=None, freq_column=None):
+    """
+    读取列式二进制格式的库。
+
+    :param path: .colib文件夹路径。
+    :param columns: 需要读取的属性列（可选），默认读取全部列。
+    :param min_freq: 频次阈值（可选），只返回频次大于等于阈值的行。
+    :param freq_column: 频次列名，与min_freq一起使用。
+    :return: dataframe
+    """
+    meta = read_meta(path)
+    names = [column["name"] for column in meta["columns"]]
+    if columns is None:
+        columns = names
+
+    # 根据行组统计信息跳过最大频次小于阈值的行组
+    rows = None
+    if min_freq is not None and meta["nrows"]:
+        row_group_size = meta["row_group_size"]
+        group_max = np.asarray(meta["stats"][freq_column]["max"])
+        freq = np.load(
+            os.path.join(path, f"col{names.index(freq_column)}.npy"), mmap_mode="r"
+        )
+        rows = np.concatenate(
+            [
+                start + np.flatnonzero(freq[start : start + row_group_size] >= min_freq)
+                for start in np.flatnonzero(group_max >= min_freq) * row_group_size
+            ]
+            or [np.empty(0, dtype=np.int64)]
+        )
+
+    pool = None
+    data = {}
+    for column in columns:
+        i = names.index(column)
+        values = np.load(os.path.join(path, f"col{i}.npy"), mmap_mode="r")
+        if rows is not None:
+            values = values[rows]
+        if meta["columns"][i]["type"] == "str":
+            if pool is None:
+                pool = StringPool(path)
+            values = pool.decode(values)
+        else:
+            values = np.array(values)
+        data[column] = values
+
+    return pd.DataFrame(data, columns=columns)
+
+
+def load_library(path, columns=None, min_freq=None, freq_column=None):
+    """
+    读取csv或列式二进制格式的库，根据扩展名自动选择读取方式。
+    参数含义与read_library相同。
+    """
+    if path.endswith(colib_suffix):
+        return read_library(path, columns, min_freq, freq_column)
+
+    df = pd.read_csv(path, usecols=columns)
+    if min_freq is not None:
+        df = df[df[freq_column] >= min_freq]
+    return df
+
+
+def iter_library(path, chunk_rows, columns=None, min_freq=None, freq_column=None):
+    """
+    按块读取csv或列式二进制格式的库，每次返回不超过chunk_rows行的dataframe。
+    列式二进制格式以内存映射方式读取，每块只解码该块用到的字符串。
+    给出min_freq时只返回频次大于等于阈值的行，列式二进制格式会跳过最大频次小于阈值的行组。
+    """
+    if not path.endswith(colib_suffix):
+        for chunk in pd.read_csv(path, usecols=columns, chunksize=chunk_rows):
+            if min_freq is not None:
+                chunk = chunk[chunk[freq_column] >= min_freq]
+            yield chunk
+        return
+
+    meta = read_meta(path)
+    names = [column["name"] for column in meta["columns"]]
+    if columns is None:
+        columns = names
+    arrays = {
+        column: np.load(os.path.join(path, f"col{names.index(column)}.npy"), mmap_mode="r")
+        for column in columns
+    }
+    pool = None
+    if any(meta["columns"][names.index(column)]["type"] == "str" for column in columns):
+        pool = StringPool(path)
+    # 空库没有行组统计信息，下面的循环也不会执行
+    if min_freq is not None and meta["nrows"]:
+        row_group_size = meta["row_group_size"]
+        group_max = np.asarray(meta["stats"][freq_column]["max"])
+        freq = np.load(
+            os.path.join(path, f"col{names.index(freq_column)}.npy"), mmap_mode="r"
+        )
+
+    for start in range(0, meta["nrows"], chunk_rows):
+        rows = slice(start, start + chunk_rows)
+        if min_freq is not None:
+            # 根据行组统计信息跳过最大频次小于阈值的行组
+            groups = group_max[start // row_group_size : -(-(start + chunk_rows) // row_group_size)]
+            if not (groups >= min_freq).any():
+                continue
+            rows = start + np.flatnonzero(freq[rows] >= min_freq)
+            if not len(rows):
+                continue
+        data = {}
+        for column in columns:
+            values = np.array(arrays[column][rows])
+            if meta["columns"][names.index(column)]["type"] == "str":
+                values = pool.decode(values)
+            data[column] = values
+        yield pd.DataFrame(data, columns=columns)
+
+
+def write_library_stream(chunks, path, nrows, sort_by=None, ascending=False, row_group_size=None):
+    """
+    将按顺序给出的多个dataframe块依次写入列式二进制格式，不需要在内存中拼接完整的库。
+    各块的属性列和类型必须一致，块的顺序即为保存的顺序，sort_by与ascending只记录在元信息中。
+
+    :param chunks: dataframe块的迭代器。
+    :param path: 保存路径，应以.colib结尾。
+    :param nrows: 所有块的总行数。
+    """
+    if row_group_size is None:
+        row_group_size = myconfig.colib_row_group_size
+
+    temp_path = path + ".tmp"
+    if os.path.exists(temp_path):
+        shutil.rmtree(temp_path)
+    os.makedirs(temp_path)
+
+    pool, pool_index = [], {}
+    columns_meta, arrays = None, None
+    row = 0
+    for chunk in chunks:
+        if columns_meta is None:
+            columns_meta = [
+                {"name": column, "type": "str"}
+                if not pd.api.types.is_numeric_dtype(chunk[column])
+                else {"name": column, "type": chunk[column].dtype.str}
+                for column in chunk.columns
+            ]
+            arrays = [
+                np.lib.format.open_memmap(
+                    os.path.join(temp_path, f"col{i}.npy"),
+                    mode="w+",
+                    dtype=np.int32 if column["type"] == "str" else np.dtype(column["type"]),
+                    shape=(nrows,),
+                )
+                for i, column in enumerate(columns_meta)
+            ]
+        for i, column in enumerate(columns_meta):
+            values = chunk[column["name"]]
+            if column["type"] == "str":
+                # 与write_library一样，缺失值编码为-1
+                codes, uniques = pd.factorize(values.to_numpy(dtype=object))
+                for item in uniques:
+                    if item not in pool_index:
+                        pool_index[item] = len(pool)
+                        pool.append(item)
+                unique_ids = np.fromiter(
+                    (pool_index[item] for item in uniques), dtype=np.int32, count=len(uniques)
+                )
+                values = np.full(len(codes), -1, dtype=np.int32)
+                values[codes >= 0] = unique_ids[codes[codes >= 0]]
+            arrays[i][row : row + len(chunk)] = values
+        row += len(chunk)
+
+    if row != nrows:
+        shutil.rmtree(temp_path)
+        raise ValueError(f"写入的行数{row}与指定的行数{nrows}不一致")
+    if columns_meta is None:
+        # 没有任何数据块时不知道属性列，由调用方保存空库
+        shutil.rmtree(temp_path)
+        raise ValueError("没有可写入的数据块")
+
+    encoded_pool = [str(item).encode("utf-8") for item in pool]
+    offsets = np.zeros(len(encoded_pool) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(item) for item in encoded_pool])
+    with open(os.path.join(temp_path, "pool.bin"), "wb") as f:
+        f.write(b"".join(encoded_pool))
+    np.save(os.path.join(temp_path, "pool_offsets.npy"), offsets)
+
+    stats = {}
+    n_groups = (nrows + row_group_size - 1) // row_group_size
+    group_starts = np.arange(n_groups) * row_group_size
+    for column, data in zip(columns_meta, arrays):
+        data.flush()
+        if column["type"] != "str" and n_groups and data.dtype.kind in "iuf":
+            stats[column["name"]] = {
+                "min": np.minimum.reduceat(data, group_starts).tolist(),
+                "max": np.maximum.reduceat(data, group_starts).tolist(),
+            }
+    del arrays
+
+    meta = {
+        "version": format_version,
+        "nrows": nrows,
+        "columns": columns_meta,
+        "sort_by": sort_by,
+        "ascending": ascending,
+        "row_group_size": row_group_size,
+        "stats": stats,
+    }
+    with open(os.path.join(temp_path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=4)
+
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.replace(temp_path, path)
+
+
+def save_library_stream(chunks, path_base, columns, nrows, library_format=None, sort_by=None, ascending=False):
+    """
+    按指定格式逐块保存库，块需已按期望的顺序排列，返回实际保存的文件路径。
+
+    :param chunks: dataframe块的迭代器。
+    :param path_base: 不含扩展名的保存路径。
+    :param columns: 属性列，用于没有数据时保存空库。
+    :param nrows: 所有块的总行数。
+    :param library_format: "csv"或"colib"，默认使用配置文件中的值。
+    :param sort_by: 块的排序列，只用于记录。
+    :param ascending: 块是否按升序排列，只用于记录。
+    """
+    if library_format is None:
+        library_format = myconfig.library_format
+
+    if nrows == 0:
+        return save_library(pd.DataFrame(columns=columns), path_base, library_format)
+
+    if library_format == "colib":
+        path = path_base + colib_suffix
+        write_library_stream(chunks, path, nrows, sort_by=sort_by, ascending=ascending)
+    elif library_format == "csv":
+        path = CoGenExport.write_csv(chunks, path_base + csv_suffix)
+    else:
+        raise ValueError(f"不支持的库格式：{library_format}")
+
+    return path
+
+
+def save_library(df, path_base, library_format=None, sort_by=None, ascending=False):
+    """
+    按指定格式保存库，返回实际保存的文件路径。
+
+    :param df: 要保存的dataframe。
+    :param path_base: 不含扩展名的保存路径。
+    :param library_format: "csv"或"colib"，默认使用配置文件中的值。
+    :param sort_by: 排序列（可选），为None时不排序。
+    :param ascending: 是否升序排序。
+    """
+    if library_format is None:
+        library_format = myconfig.library_format
+
+    if library_format == "colib":
+        path = path_base + colib_suffix
+        write_library(df, path, sort_by=sort_by, ascending=ascending)
+    elif library_format == "csv":
+        # 先写入临时文件再替换，避免中断时留下不完整的库
+        path = CoGenExport.write_csv(
+            df, path_base + csv_suffix, sort_by=sort_by, ascending=ascending
+        )
+    else:
+        raise ValueError(f"不支持的库格式：{library_format}")
+
+    return path
+
+
+def remove_library(path):
+    """删除csv文件或colib文件夹，不存在时忽略。"""
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def unique_path_base(path_base):
+    """
+    若path_base对应的库已存在（任一格式），在末尾追加序号，返回不会覆盖已有文件的路径。
+    """
+    candidate, n = path_base, 0
+    while os.path.exists(candidate + csv_suffix) or os.path.exists(candidate + colib_suffix):
+        n += 1
+        candidate = f"{path_base}-{n}"
+    return candidate
+
+
+def resolve_library_path(path_base):
+    """
+    根据不含扩展名的路径查找已存在的库，优先使用列式二进制格式。
+    """
+    if os.path.exists(path_base + colib_suffix):
+        return path_base + colib_suffix
+    return path_base + csv_suffix
+
+
+def export_csv(colib_path, csv_path):
+    """将列式二进制格式的库逐块导出为csv，不需要一次读入整个库。"""
+    return CoGenExport.write_csv(
+        iter_library(colib_path, myconfig.export_block_rows), csv_path
+    )
@@ -0,0 +1,251 @@
+import os
+import json
+import shutil
+import cProfile
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import CoGenConfig as myconfig
+import CoLibFormat
+
+#使用方法：
+# import CoLibIndex
+# CoLibIndex.build_index("res/collocationLibrary_xxx.csv", "res/collocationLibrary_xxx.coidx")
+# index = CoLibIndex.CollocationIndex("res/collocationLibrary_xxx.coidx")
+# index.top_collocates("发展", k=10)                          # 词语1为"发展"的频次最高的10个搭配
+# index.top_collocates("发展", k=10, role="词语2", rel="amod")  # 词语2为"发展"、依存关系为amod的搭配
+# index.pair_freq("经济", "发展")                              # 词语对在所有词性与依存关系下的频次之和
+# index.close()
+
+# 搭配查询索引（.coidx）是一个文件夹，包含：
+#   meta.json            行数、词语数、词性表与依存关系表
+#   words.npy            按字符串升序排列的全部词语，utf-8编码后依次拼接
+#   word_offsets.npy     每个词语在words.npy中的字节偏移，长度为词语数+1
+#   {role}_indptr.npy    CSR行指针：词语i作为role（w1为词语1，w2为词语2）的搭配位于[indptr[i], indptr[i+1])
+#   {role}_partner.npy   搭配中另一个词语的编号，每个词语的搭配按频次降序排列
+#   {role}_pos1.npy、{role}_pos2.npy、{role}_rel.npy、{role}_freq.npy  词语1词性、词语2词性、依存关系编号与频次
+#   {role}_pair_partner.npy、{role}_pair_pos.npy  每个词语的搭配按另一个词语的编号排序后的编号及其位置，用于词语对查询
+# 所有npy文件都以内存映射方式读取，查询时只访问用到的部分。
+
+index_suffix = ".coidx"
+index_version = 1
+# 索引中的两种角色：查询的词语作为词语1（搭配词为词语2），或作为词语2（搭配词为词语1）
+roles = {"词语1": "w1", "词语2": "w2"}
+# 每个角色对应的搭配词所在列
+partner_columns = {"词语1": "词语2", "词语2": "词语1"}
+
+
+def build_index(library_path, index_path):
+    """
+    将搭配库（csv或colib格式）转换为搭配查询索引。
+
+    :param library_path: 搭配库文件路径。
+    :param index_path: 索引保存路径，应以.coidx结尾。
+    """
+    df = CoLibFormat.load_library(library_path, columns=myconfig.full_columns)
+    df = df.dropna(subset=myconfig.partial_columns)
+
+    # 词语、词性与依存关系都按字符串升序编号，词语的编号顺序即utf-8字节顺序，查询时可二分查找
+    words = sorted(set(df["词语1"]).union(df["词语2"]))
+    pos = sorted(set(df["词语1词性"]).union(df["词语2词性"]))
+    rels = sorted(set(df["词语间依存关系"]))
+    word_ids = {
+        column: pd.Index(words).get_indexer(df[column]).astype(np.int32)
+        for column in ["词语1", "词语2"]
+    }
+    pos1 = pd.Index(pos).get_indexer(df["词语1词性"]).astype(np.int16)
+    pos2 = pd.Index(pos).get_indexer(df["词语2词性"]).astype(np.int16)
+    rel = pd.Index(rels).get_indexer(df["词语间依存关系"]).astype(np.int16)
+    freq = df["搭配频次"].to_numpy(dtype=np.int64)
+
+    # 先写入临时文件夹，完成后再替换，避免中断时留下不完整的索引
+    temp_path = index_path + ".tmp"
+    if os.path.exists(temp_path):
+        shutil.rmtree(temp_path)
+    os.makedirs(temp_path)
+
+    encoded = [word.encode("utf-8") for word in words]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(item) for item in encoded])
+    np.save(os.path.join(temp_path, "words.npy"), np.frombuffer(b"".join(encoded), dtype=np.uint8))
+    np.save(os.path.join(temp_path, "word_offsets.npy"), offsets)
+
+    for column, role in roles.items():
+        key, partner = word_ids[column], word_ids[partner_columns[column]]
+        # 按词语分组，组内按频次降序
+        order = np.lexsort((-freq, key))
+        indptr = np.zeros(len(words) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.bincount(key, minlength=len(words)))
+        arrays = {
+            "indptr": indptr,
+            "partner": partner[order],
+            "pos1": pos1[order],
+            "pos2": pos2[order],
+            "rel": rel[order],
+            "freq": freq[order],
+        }
+        # 组内再按搭配词编号排序，记录在频次降序数组中的位置
+        pair_pos = np.lexsort((arrays["partner"], key[order]))
+        arrays["pair_partner"] = arrays["partner"][pair_pos]
+        arrays["pair_pos"] = pair_pos.astype(np.int64)
+        for name, array in arrays.items():
+            np.save(os.path.join(temp_path, f"{role}_{name}.npy"), array)
+
+    meta = {
+        "version": index_version,
+        "nrows": len(df),
+        "nwords": len(words),
+        "pos": pos,
+        "rels": rels,
+    }
+    with open(os.path.join(temp_path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=4)
+
+    if os.path.exists(index_path):
+        shutil.rmtree(index_path)
+    os.replace(temp_path, index_path)
+
+
+class WordTable:
+    """按字节升序排列的词语表，以内存映射方式读取，可按编号取词语或二分查找词语的编号。"""
+
+    def __init__(self, words, offsets):
+        # 直接在内存映射的缓冲区上切片，避免逐个元素创建numpy标量
+        self.words = memoryview(words)
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.word_bytes(i).decode("utf-8")
+
+    def word_bytes(self, i):
+        return self.words[int(self.offsets[i]) : int(self.offsets[i + 1])].tobytes()
+
+    def find(self, word):
+        """返回词语的编号，不存在时返回-1。"""
+        target = word.encode("utf-8")
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.word_bytes(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self) and self.word_bytes(lo) == target:
+            return lo
+        return -1
+
+
+class CollocationIndex:
+    """
+    搭配查询索引，以内存映射方式打开，不需要读入整个搭配库。
+    每次查询只访问一个词语的搭配列表，耗时与搭配库大小无关。
+    """
+
+    def __init__(self, index_path):
+        with open(os.path.join(index_path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.pos = self.meta["pos"]
+        self.rels = self.meta["rels"]
+        self.rel_ids = {rel: i for i, rel in enumerate(self.rels)}
+
+        def load(name):
+            # 转换为普通数组视图，数据仍以内存映射方式按需读取，但索引时没有memmap子类的额外开销
+            return np.asarray(np.load(os.path.join(index_path, f"{name}.npy"), mmap_mode="r"))
+
+        self.words = WordTable(load("words"), load("word_offsets"))
+        self.arrays = {
+            role: {
+                name: load(f"{role}_{name}")
+                for name in ["indptr", "partner", "pos1", "pos2", "rel", "freq", "pair_partner", "pair_pos"]
+            }
+            for role in roles.values()
+        }
+
+    def word_id(self, word):
+        """返回词语在索引中的编号，不存在时返回-1。"""
+        return self.words.find(word)
+
+    def rows(self, role, positions):
+        """将搭配列表中的位置（切片或位置数组）解码为搭配记录。"""
+        arrays = self.arrays[roles[role]]
+        columns = [arrays[name][positions].tolist() for name in ["partner", "pos1", "pos2", "rel", "freq"]]
+        return [
+            {
+                partner_columns[role]: self.words[partner],
+                "词语1词性": self.pos[pos1],
+                "词语2词性": self.pos[pos2],
+                "词语间依存关系": self.rels[rel],
+                "搭配频次": freq,
+            }
+            for partner, pos1, pos2, rel, freq in zip(*columns)
+        ]
+
+    def top_collocates(self, word, k=10, role="词语1", rel=None):
+        """
+        返回词语频次最高的k个搭配，按频次降序排列。
+
+        :param word: 查询的词语。
+        :param k: 返回的搭配个数。
+        :param role: 查询的词语作为"词语1"（默认）或"词语2"。
+        :param rel: 依存关系（可选），只返回该依存关系的搭配。
+        :return: 搭配记录的列表，每条记录包含搭配词、词性、依存关系与频次。
+        """
+        i = self.word_id(word)
+        if i < 0:
+            return []
+        arrays = self.arrays[roles[role]]
+        start, end = int(arrays["indptr"][i]), int(arrays["indptr"][i + 1])
+
+        if rel is None:
+            positions = slice(start, min(end, start + k))
+        else:
+            if rel not in self.rel_ids:
+                return []
+            positions = start + np.flatnonzero(arrays["rel"][start:end] == self.rel_ids[rel])[:k]
+        return self.rows(role, positions)
+
+    def pair_freq(self, word1, word2, rel=None):
+        """
+        返回词语对(词语1, 词语2)的频次，rel为None时为所有词性与依存关系下的频次之和。
+        """
+        i, j = self.word_id(word1), self.word_id(word2)
+        if i < 0 or j < 0 or (rel is not None and rel not in self.rel_ids):
+            return 0
+        arrays = self.arrays[roles["词语1"]]
+        start, end = int(arrays["indptr"][i]), int(arrays["indptr"][i + 1])
+        partners = arrays["pair_partner"][start:end]
+        lo, hi = np.searchsorted(partners, j, side="left"), np.searchsorted(partners, j, side="right")
+        positions = arrays["pair_pos"][start + lo : start + hi]
+        if rel is not None:
+            positions = positions[arrays["rel"][positions] == self.rel_ids[rel]]
+        return int(arrays["freq"][positions].sum())
+
+    def close(self):
+        self.words = None
+        self.arrays = None
+
+
+def main():
+    library_path = myconfig.library_path_CoLibIndex
+    index_path = myconfig.index_path_CoLibIndex
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+
+    print(f"正在为{library_path}建立搭配查询索引，结果将存放至{index_path}")
+    build_index(library_path, index_path)
+
+    # 时间戳
+    timestamp = datetime.now().strftime("%m%d%H%M")
+    profiler.disable()
+    #是否保存性能分析结果
+    saveTag=myconfig.save_profiler
+    if(saveTag):
+        profiler.dump_stats(f"performance_analysis_4_CoLibIndex_{timestamp}.prof")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+import os
+import json
+import time
+import threading
+import functools
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+import pandas as pd
+import CoGenConfig as myconfig
+import CoLibFormat
+import CoLibIndex
+
+#使用方法：
+# python CoLibServer.py            # 按配置文件启动本地查询服务，搭配库索引与关键词库只在启动时读取一次
+# curl "http://127.0.0.1:8765/top_collocates?word=发展&k=10&role=词语1&rel=amod"
+# curl "http://127.0.0.1:8765/pair_freq?word1=经济&word2=发展"
+# curl "http://127.0.0.1:8765/keyword_freq?word=发展"
+# curl -X POST "http://127.0.0.1:8765/batch" -d '{"queries": [{"type": "pair_freq", "word1": "经济", "word2": "发展"}]}'
+# curl "http://127.0.0.1:8765/stats"
+# 在python中也可以直接使用QueryEngine：
+# engine = CoLibServer.QueryEngine(colib_index_path, keyword_library_path)
+# engine.query("top_collocates", {"word": "发展", "k": 10})
+
+# 每种查询的参数及默认值，None表示必须给出
+query_params = {
+    "pair_freq": {"word1": None, "word2": None, "rel": ""},
+    "top_collocates": {"word": None, "k": 10, "role": "词语1", "rel": ""},
+    "keyword_freq": {"word": None},
+}
+# 统计延迟分位数时保留的最近查询数
+latency_window = 10000
+
+
+class KeywordTable:
+    """
+    关键词库的查询表：按关键词排序后以CSR形式保存每个关键词各词性的词频，关键词通过哈希表定位。
+    """
+
+    def __init__(self, library_path):
+        df = CoLibFormat.load_library(library_path, columns=myconfig.words_full_columns)
+        df = df.dropna(subset=myconfig.words_partial_columns).sort_values(
+            by=["关键词", "词频"], ascending=[True, False], kind="stable"
+        )
+        self.keywords, starts = np.unique(df["关键词"].to_numpy(dtype=object), return_index=True)
+        self.index = pd.Index(self.keywords)
+        self.indptr = np.append(starts, len(df))
+        self.pos = df["词性"].to_numpy(dtype=object)
+        self.freq = df["词频"].to_numpy(dtype=np.int64)
+        self.totals = np.add.reduceat(self.freq, starts) if len(df) else np.empty(0, dtype=np.int64)
+
+    def lookup(self, word):
+        """返回关键词的总词频与各词性的词频，不存在时总词频为0。"""
+        i = self.index.get_indexer([word])[0]
+        if i < 0:
+            return {"关键词": word, "词频": 0, "词性": {}}
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return {
+            "关键词": word,
+            "词频": int(self.totals[i]),
+            "词性": dict(zip(self.pos[start:end].tolist(), self.freq[start:end].tolist())),
+        }
+
+
+class QueryStats:
+    """按查询种类统计次数、平均延迟与延迟分位数，以及服务启动以来的吞吐量。"""
+
+    def __init__(self):
+        self.start_time = time.time()
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.total_seconds = {}
+        self.recent = {}
+        self.requests = 0
+
+    def add_request(self):
+        with self.lock:
+            self.requests += 1
+
+    def add(self, kind, seconds):
+        with self.lock:
+            self.counts[kind] = self.counts.get(kind, 0) + 1
+            self.total_seconds[kind] = self.total_seconds.get(kind, 0.0) + seconds
+            self.recent.setdefault(kind, deque(maxlen=latency_window)).append(seconds)
+
+    def report(self):
+        with self.lock:
+            uptime = time.time() - self.start_time
+            queries = {}
+            for kind, count in self.counts.items():
+                recent = np.array(self.recent[kind]) * 1e6
+                queries[kind] = {
+                    "count": count,
+                    "mean_us": self.total_seconds[kind] / count * 1e6,
+                    "p50_us": float(np.percentile(recent, 50)),
+                    "p99_us": float(np.percentile(recent, 99)),
+                }
+            total = sum(self.counts.values())
+            return {
+                "uptime_seconds": uptime,
+                "requests": self.requests,
+                "queries": total,
+                "queries_per_second": total / uptime if uptime else 0.0,
+                "by_type": queries,
+            }
+
+
+class QueryEngine:
+    """
+    搭配与关键词查询：搭配库使用CoLibIndex的内存映射索引，关键词库读入内存一次。
+    查询结果经过容量有限的LRU缓存，热点查询直接返回缓存结果。
+    """
+
+    def __init__(self, colib_index_path=None, keyword_library_path=None, cache_size=None):
+        """
+        :param colib_index_path: 搭配查询索引（.coidx）路径，为空时不提供搭配查询。
+        :param keyword_library_path: 关键词库（csv或colib）路径，为空时不提供关键词查询。
+        :param cache_size: LRU缓存的最大条目数，默认使用配置文件中的值，为0时不缓存。
+        """
+        if cache_size is None:
+            cache_size = myconfig.cache_size_CoLibServer
+        self.colib_index = CoLibIndex.CollocationIndex(colib_index_path) if colib_index_path else None
+        self.keyword_table = KeywordTable(keyword_library_path) if keyword_library_path else None
+        self.stats = QueryStats()
+        self.cached_run = functools.lru_cache(maxsize=cache_size)(self.run)
+
+    def run(self, kind, values):
+        """执行一次查询，values为按query_params顺序排列的参数值。"""
+        params = dict(zip(query_params[kind], values))
+        if kind == "keyword_freq":
+            if self.keyword_table is None:
+                raise ValueError("没有加载关键词库。")
+            return self.keyword_table.lookup(params["word"])
+
+        if self.colib_index is None:
+            raise ValueError("没有加载搭配库索引。")
+        rel = params["rel"] or None
+        if kind == "pair_freq":
+            return {
+                "词语1": params["word1"],
+                "词语2": params["word2"],
+                "搭配频次": self.colib_index.pair_freq(params["word1"], params["word2"], rel),
+            }
+        if params["role"] not in CoLibIndex.roles:
+            raise ValueError(f"role应为词语1或词语2：{params['role']}")
+        return self.colib_index.top_collocates(params["word"], params["k"], params["role"], rel)
+
+    def query(self, kind, params):
+        """
+        执行一次查询并记录延迟。参数错误时抛出ValueError：缺少参数、k不是正整数、其他参数不是字符串。
+
+        :param kind: 查询种类，见query_params。
+        :param params: 参数字典，缺少的可选参数使用默认值。
+        """
+        if kind not in query_params:
+            raise ValueError(f"不支持的查询：{kind}")
+        values = []
+        for name, default in query_params[kind].items():
+            value = params.get(name, default)
+            if value is None:
+                raise ValueError(f"缺少参数：{name}")
+            if name == "k":
+                value = int(value)
+                if value <= 0:
+                    raise ValueError(f"k应为正整数：{value}")
+            elif not isinstance(value, str):
+                raise ValueError(f"参数{name}应为字符串：{value!r}")
+            values.append(value)
+
+        start = time.perf_counter()
+        result = self.cached_run(kind, tuple(values))
+        self.stats.add(kind, time.perf_counter() - start)
+        return result
+
+    def batch(self, queries):
+        """
+        在一次请求中执行多个查询，返回与queries一一对应的结果，出错的查询对应{"error": 出错说明}。
+        queries不是列表时抛出ValueError。
+        """
+        if not isinstance(queries, list):
+            raise ValueError("queries应为查询的列表")
+        results = []
+        for query in queries:
+            if not isinstance(query, dict):
+                results.append({"error": f"查询应为json对象：{query!r}"})
+                continue
+            try:
+                results.append(self.query(query.get("type"), query))
+            except (ValueError, TypeError) as e:
+                results.append({"error": str(e)})
+        return results
+
+    def report(self):
+        """返回查询统计与缓存使用情况。"""
+        report = self.stats.report()
+        cache_info = self.cached_run.cache_info()
+        lookups = cache_info.hits + cache_info.misses
+        report["cache"] = {
+            "hits": cache_info.hits,
+            "misses": cache_info.misses,
+            "hit_rate": cache_info.hits / lookups if lookups else 0.0,
+            "size": cache_info.currsize,
+            "max_size": cache_info.maxsize,
+        }
+        return report
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """
+    HTTP接口：GET /pair_freq、/top_collocates、/keyword_freq、/stats，POST /batch，结果均为json。
+    """
+
+    def send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        engine = self.server.engine
+        engine.stats.add_request()
+        url = urlparse(self.path)
+        kind = url.path.strip("/")
+        if kind == "stats":
+            self.send_json(200, engine.report())
+            return
+        if kind not in query_params:
+            self.send_json(404, {"error": f"不支持的查询：{kind}"})
+            return
+        params = {name: values[0] for name, values in parse_qs(url.query).items()}
+        try:
+            self.send_json(200, engine.query(kind, params))
+        except (ValueError, TypeError) as e:
+            self.send_json(400, {"error": str(e)})
+
+    def do_POST(self):
+        engine = self.server.engine
+        engine.stats.add_request()
+        if urlparse(self.path).path.strip("/") != "batch":
+            self.send_json(404, {"error": "批量查询请使用POST /batch"})
+            return
+        try:
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            results = engine.batch(json.loads(body)["queries"])
+        except (ValueError, KeyError, TypeError) as e:
+            self.send_json(400, {"error": f"请求格式错误：{e}"})
+            return
+        self.send_json(200, {"results": results})
+
+    def log_message(self, format, *args):
+        # 逐个请求的日志会拖慢高频查询，统计信息见/stats
+        pass
+
+
+def make_server(engine, host=None, port=None):
+    """创建绑定到本地地址的多线程HTTP服务，engine为QueryEngine。"""
+    if host is None:
+        host = myconfig.host_CoLibServer
+    if port is None:
+        port = myconfig.port_CoLibServer
+    server = ThreadingHTTPServer((host, port), QueryHandler)
+    server.daemon_threads = True
+    server.engine = engine
+    return server
+
+
+def main():
+    colib_index_path = myconfig.colib_index_path_CoLibServer
+    keyword_library_path = myconfig.keyword_library_path_CoLibServer
+
+    # 只给出搭配库时先建立查询索引
+    colib_library_path = myconfig.colib_library_path_CoLibServer
+    if colib_library_path and colib_index_path and not os.path.exists(colib_index_path):
+        print(f"正在为{colib_library_path}建立搭配查询索引，结果将存放至{colib_index_path}")
+        CoLibIndex.build_index(colib_library_path, colib_index_path)
+
+    engine = QueryEngine(colib_index_path, keyword_library_path)
+    server = make_server(engine)
+    print(f"查询服务已启动：http://{server.server_address[0]}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(engine.report(), ensure_ascii=False, indent=4))
+
+
+if __name__ == "__main__":
+    main()
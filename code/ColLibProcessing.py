@@ -3,34 +3,76 @@ import os
 from datetime import datetime
 import cProfile
 import CoGenConfig as myconfig
-from tqdm import tqdm
+import CoLibFormat
+import CoGenExport
 
 
-def save_to_txt(df, file_path):
+def save_to_txt(df, file_path, sort_by=["词语1", "词语2"]):
     """
-    将DataFrame保存为特定格式的txt文件。
+    将DataFrame保存为特定格式的txt文件，每行为"词语1 词语2:搭配频次"。
 
     :param df: 要保存的DataFrame。
     :param file_path: txt文件的保存路径。
+    :param sort_by: 排序列，默认按照词语1升序，词语2升序排序；df已排好顺序时传入None跳过排序。
     """
     n=myconfig.Freq_n_ColLibProcessing
-    sI=myconfig.search_index_ColLibProcessing
-    plusStr=f"_n={n}_sI={sI}"
+    plusStr=f"_n={n}"
 
     file_path = file_path + plusStr+".txt"
 
-    # 按照词语1升序，词语2升序排序
-    df = df.sort_values(by=["词语1", "词语2"])
-    
-    # 将数据格式化为字符串
-    formatted_data = df.apply(
-        lambda row: f"{row['词语1']} {row['词语2']}:{row['搭配频次']}", axis=1
+    # 按列整体格式化后分块写入
+    return CoGenExport.write_txt(
+        df,
+        file_path,
+        ["词语1", "词语2", "搭配频次"],
+        [" ", ":"],
+        sort_by=sort_by,
+        compression=myconfig.txt_compression,
     )
 
-    # 保存为txt文件
-    with open(file_path, "w", encoding="utf-8") as file:
-        for line in formatted_data:
-            file.write(line + "\n")
+
+def filter_colib_chunk(chunk, Freq_n, CoLib_exclude_dep, CoLib_exclude_pos):
+    """
+    对搭配库的一个数据块应用频次阈值和黑名单过滤，并按(词语1, 词语2)合并频次。
+
+    :return: 以(词语1, 词语2)为索引的搭配频次Series。
+    """
+    chunk = chunk[chunk["搭配频次"] >= Freq_n]
+    # 根据词语间依存关系黑名单过滤
+    chunk = chunk[~chunk["词语间依存关系"].isin(CoLib_exclude_dep)]
+    # 根据词性黑名单过滤：如果两个词语中任意一个词在黑名单中则不要该搭配
+    chunk = chunk[
+        ~(chunk["词语1词性"].isin(CoLib_exclude_pos) | chunk["词语2词性"].isin(CoLib_exclude_pos))
+    ]
+    return chunk.groupby(["词语1", "词语2"])["搭配频次"].sum()
+
+
+def read_filtered_colib(colib_file, Freq_n, CoLib_exclude_dep, CoLib_exclude_pos, chunk_rows=None):
+    """
+    分块读取搭配库，读取时即应用频次阈值和黑名单过滤，只保留通过过滤的行并按(词语1, 词语2)部分合并。
+    内存占用取决于过滤后的结果大小和块大小，而不是搭配库的大小。
+
+    :return: 列为词语1、词语2、搭配频次的dataframe，按词语1、词语2升序排列。
+    """
+    if chunk_rows is None:
+        chunk_rows = myconfig.chunk_rows_ColLibProcessing
+
+    parts, part_rows, merged_rows = [], 0, 0
+    # 列式二进制格式可以根据行组统计信息直接跳过频次低于阈值的行组
+    for chunk in CoLibFormat.iter_library(
+        colib_file, chunk_rows, min_freq=Freq_n, freq_column="搭配频次"
+    ):
+        part = filter_colib_chunk(chunk, Freq_n, CoLib_exclude_dep, CoLib_exclude_pos)
+        parts.append(part)
+        part_rows += len(part)
+        # 未合并的行数超过已合并的行数时再合并，总代价与输入行数近似线性
+        if part_rows >= max(merged_rows, chunk_rows):
+            parts = [pd.concat(parts).groupby(level=[0, 1]).sum()]
+            merged_rows = part_rows = len(parts[0])
+
+    if not parts:
+        return pd.DataFrame({"词语1": [], "词语2": [], "搭配频次": []})
+    return pd.concat(parts).groupby(level=[0, 1]).sum().reset_index()
 
 
 def process_colib_data(
@@ -61,26 +103,12 @@ def process_colib_data(
         # 读取搭配库文件
         if not os.path.exists(colib_file):
             raise FileNotFoundError(f"搭配库文件 '{colib_file}' 不存在。")
-        colib_data = pd.read_csv(colib_file)
-
-        # 过滤操作
-        colib_data = colib_data[colib_data["搭配频次"] >= Freq_n]
-        # 根据词语间依存关系黑名单过滤
-        colib_data = colib_data[~colib_data["词语间依存关系"].isin(CoLib_exclude_dep)]
-        # 根据词性黑名单过滤：如果两个词语中任意一个词在黑名单中则不要该搭配
-        colib_data = colib_data[
-            ~(
-                colib_data["词语1词性"].isin(CoLib_exclude_pos)
-                | colib_data["词语2词性"].isin(CoLib_exclude_pos)
-            )
-        ]
-
+        # 边读取边过滤，只保留通过过滤的行并按(词语1, 词语2)合并
+        colib_data = read_filtered_colib(
+            colib_file, Freq_n, CoLib_exclude_dep, CoLib_exclude_pos
+        )
         print("过滤操作已完成。")
 
-        # 删除不需要的列并合并
-        colib_data = colib_data.drop(columns=["词语1词性", "词语2词性", "词语间依存关系"])
-        colib_data = colib_data.groupby(["词语1", "词语2"]).sum().reset_index()
-
         # 添加辅助计算列
         colib_data["is_del"] = 0
 
@@ -103,13 +131,13 @@ def process_colib_data(
         # )
 
         # 使用txt
-        # 分离并保存表格
+        # 分离并保存表格，rule_2已按照词语1、词语2排好顺序，保存时不再排序
         if aux_result_file:
             aux_data = colib_data[colib_data["is_del"] == 1].drop(columns=["is_del"])
-            save_to_txt(aux_data, aux_result_file)
+            save_to_txt(aux_data, aux_result_file, sort_by=None)
 
         result_data = colib_data[colib_data["is_del"] == 0].drop(columns=["is_del"])
-        save_to_txt(result_data, result_file)
+        save_to_txt(result_data, result_file, sort_by=None)
 
     except Exception as e:
         print(f"处理过程中发生错误: {e}")
@@ -128,9 +156,31 @@ def rule_1(df):
     return df
 
 
+def mark_contained_single_chars(df, group_column, word_column):
+    """
+    在按group_column分组的每组中，如果word_column为单个汉字的行，其汉字出现在同组另一行的多字word_column中，
+    则is_del置为1。每组先建立多字词语所含汉字的索引，单字行直接查索引，与组的大小和行的顺序无关。
+    """
+    words = df[word_column].tolist()
+    groups = df[group_column].tolist()
+
+    # 每组多字词语中出现过的汉字
+    char_index = {}
+    for group, word in zip(groups, words):
+        if len(word) > 1:
+            char_index.setdefault(group, set()).update(word)
+
+    empty = set()
+    contained = [
+        len(word) == 1 and word in char_index.get(group, empty) for group, word in zip(groups, words)
+    ]
+    df.loc[contained, "is_del"] = 1
+
+
 def rule_2(df):
     """
-    处理DataFrame，标记符合特定条件的搭配为删除。
+    处理DataFrame，标记符合特定条件的搭配为删除：
+    词语2相同的搭配中，单字的词语1包含在其他搭配的词语1中时删除；词语1相同时对词语2同样处理。
 
     参数:
     df (DataFrame): 包含列 '词语1', '词语2' 的DataFrame。
@@ -138,51 +188,14 @@ def rule_2(df):
     返回:
     DataFrame: 处理后的DataFrame。 
     """
-    # 定义邻近搜索范围
-    search_index = myconfig.search_index_ColLibProcessing
-    print(f"当前邻近搜索范围为：{search_index}")
-    # 函数，检查a是否是b的子句
-    is_subclause = lambda a, b: a in b
-    # 第一步：按照 '词语2' 排序并处理
-    df.sort_values(by=["词语2", "词语1"], inplace=True)
-    #重置索引
     df.reset_index(drop=True, inplace=True)
-    for i in tqdm(range(len(df)), desc="Processing '词语2'", mininterval=10):
-        if len(df.iloc[i]["词语1"]) == 1:  # 如果 '词语1' 是单个汉字
-            # 向上搜索
-            for j in range(i - 1, max(-1, i - search_index - 1), -1):
-                if df.iloc[j]["词语2"] != df.iloc[i]["词语2"]:
-                    break
-                if is_subclause(df.iloc[i]["词语1"], df.iloc[j]["词语1"]):
-                    df.at[i, "is_del"] = 1
-                    break
-            # 向下搜索
-            for j in range(i + 1, min(len(df), i + search_index + 1)):
-                if df.iloc[j]["词语2"] != df.iloc[i]["词语2"]:
-                    break
-                if is_subclause(df.iloc[i]["词语1"], df.iloc[j]["词语1"]):
-                    df.at[i, "is_del"] = 1
-                    break
-    # 第二步：按照 '词语1' 排序并处理
+    # 第一步：按照 '词语2' 分组处理
+    mark_contained_single_chars(df, "词语2", "词语1")
+    # 第二步：按照 '词语1' 分组处理
+    mark_contained_single_chars(df, "词语1", "词语2")
     df.sort_values(by=["词语1", "词语2"], inplace=True)
     #重置索引
     df.reset_index(drop=True, inplace=True)
-    for i in tqdm(range(len(df)), desc="Processing '词语1'", mininterval=10):
-        if len(df.iloc[i]["词语2"]) == 1:  # 如果 '词语2' 是单个汉字
-            # 向上搜索
-            for j in range(i - 1, max(-1, i - search_index - 1), -1):
-                if df.iloc[j]["词语1"] != df.iloc[i]["词语1"]:
-                    break
-                if is_subclause(df.iloc[i]["词语2"], df.iloc[j]["词语2"]):
-                    df.at[i, "is_del"] = 1
-                    break
-            # 向下搜索
-            for j in range(i + 1, min(len(df), i + search_index + 1)):
-                if df.iloc[j]["词语1"] != df.iloc[i]["词语1"]:
-                    break
-                if is_subclause(df.iloc[i]["词语2"], df.iloc[j]["词语2"]):
-                    df.at[i, "is_del"] = 1
-                    break
     return df
 
 
@@ -192,7 +205,8 @@ def main():
     resrootname = myconfig.resrootname_ColLibProcessing
     resname = "res_" + partname
 
-    yuliaoku = os.path.join(rootname, partname) + ".csv"
+    # 优先读取colib格式的库，不存在时读取csv格式
+    yuliaoku = CoLibFormat.resolve_library_path(os.path.join(rootname, partname))
     dapeikujieguo = os.path.join(resrootname, resname)
 
     if myconfig.need_del:
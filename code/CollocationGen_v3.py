@@ -1,47 +1,56 @@
 import pandas as pd
+import numpy as np
 from tqdm import tqdm
 import os
 from datetime import datetime
 import cProfile
 import json
 import gc
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import CoGenConfig as myconfig
+import CoGenVocab
+import CoLibFormat
+import CoGenCorpusIO
 
 # 定义两种情况的属性列
 full_columns = myconfig.full_columns
 partial_columns = myconfig.partial_columns
+# 运行日志文件名，与增量分片存放在同一文件夹中
+journal_filename = "collocationLibrary-journal.json"
+# 增量分片文件名的前缀
+shard_prefix = "collocationLibrary-shard-"
+# 单句处理时随搭配一起记录的依存词与中心词位置列
+position_columns = ["依存词位置", "中心词位置"]
 
 
 def singleSentenceProcess(sentTok, sentPos, sentDep):
     '''
     对单个句子进行特定处理。
     '''
-    # 创建一个新的dataframe
-    singleSentenceCollocation = pd.DataFrame(columns=partial_columns)
+    # 创建一个新的dataframe，额外记录依存词与中心词在句子中的位置，供规则2使用
+    singleSentenceCollocation = pd.DataFrame(columns=partial_columns + position_columns)
 
     # 根据句法分析结果填充dataframe
     for i, (center_idx, relation) in enumerate(sentDep):
         # 获取中心词和当前词，并确保word1的索引小于word2
         if center_idx != 0 and center_idx - 1 <= i:
-            word1 = sentTok[center_idx - 1]
-            word2 = sentTok[i]
-            pos1 = sentPos[center_idx - 1]
-            pos2 = sentPos[i]
+            idx1, idx2 = center_idx - 1, i
         elif center_idx != 0 and center_idx - 1 > i:
-            word1 = sentTok[i]
-            word2 = sentTok[center_idx - 1]
-            pos1 = sentPos[i]
-            pos2 = sentPos[center_idx - 1]
+            idx1, idx2 = i, center_idx - 1
         else:
             continue  # 如果center_idx是0，即当前词是root，我们就跳过不添加
 
         new_row = pd.DataFrame(
             {
-                "词语1": [word1],
-                "词语2": [word2],
-                "词语1词性": [pos1],
-                "词语2词性": [pos2],
+                "词语1": [sentTok[idx1]],
+                "词语2": [sentTok[idx2]],
+                "词语1词性": [sentPos[idx1]],
+                "词语2词性": [sentPos[idx2]],
                 "词语间依存关系": [relation],
+                "依存词位置": [i],
+                "中心词位置": [center_idx - 1],
             }
         )
 
@@ -54,7 +63,7 @@ def singleSentenceProcess(sentTok, sentPos, sentDep):
     singleSentenceCollocation = rule_3(singleSentenceCollocation)
     singleSentenceCollocation = rule_2(singleSentenceCollocation, sentTok, sentDep)
 
-    return singleSentenceCollocation
+    return singleSentenceCollocation.drop(columns=position_columns)
 
 
 def rule_1(singleSentenceCollocation):
@@ -76,49 +85,36 @@ def rule_1(singleSentenceCollocation):
 def rule_2(singleSentenceCollocation, sentTok, sentDep):
     '''
     规则2：对于复合名词，只保留离该组复合名词根节点最近的那一个搭配，注意，当前默认根节点是一组复合名词中最后一个名词。
+    直接使用依存弧下标定位词语，搭配表需要带有依存词位置和中心词位置两列。
     '''
-    # 初始化一个空的DataFrame用于存储最终结果
-    filtered_collocations = pd.DataFrame(columns=singleSentenceCollocation.columns)
-
-    # 第一步：收集所有compound:nn依存关系的中心词
-    center_words = {
-        center_idx
-        for _, (center_idx, relation) in enumerate(sentDep)
-        if relation == "compound:nn"
-    }
-
-    # 第二步：对于每个中心词，找到最近的搭配
-    for center_idx in center_words:
-        nearest_collocation = None
-        min_distance = float("inf")
-
-        # 遍历所有搭配，寻找最近的搭配
-        for i, row in singleSentenceCollocation.iterrows():
-            if (
-                row["词语间依存关系"] == "compound:nn"
-                and row["词语2"] == sentTok[center_idx - 1]
-            ):
-                if row["词语1"] in sentTok:
-                    current_distance = abs(center_idx - 1 - sentTok.index(row["词语1"]))
-                    if current_distance < min_distance:
-                        nearest_collocation = row
-                        min_distance = current_distance
-
-        # 添加最近的搭配到结果DataFrame中
-        if nearest_collocation is not None:
-            filtered_collocations = pd.concat(
-                [filtered_collocations, nearest_collocation.to_frame().T],
-                ignore_index=True,
+    # 一次遍历依存弧，为每个compound:nn的中心词找到其前方最近的依存词
+    nearest_dependent = {}
+    for i, (center_idx, relation) in enumerate(sentDep):
+        if relation == "compound:nn" and i < center_idx - 1:
+            # 依存词下标递增，后出现的依存词离中心词更近
+            nearest_dependent[center_idx - 1] = i
+
+    is_compound = singleSentenceCollocation["词语间依存关系"] == "compound:nn"
+    compound_collocations = singleSentenceCollocation[is_compound]
+
+    # 只保留中心词与其最近依存词构成的搭配，并按中心词位置排列
+    is_nearest = np.array(
+        [
+            nearest_dependent.get(center) == dependent
+            for dependent, center in zip(
+                compound_collocations["依存词位置"], compound_collocations["中心词位置"]
             )
+        ],
+        dtype=bool,
+    )
+    filtered_collocations = compound_collocations[is_nearest].sort_values(
+        by="中心词位置", kind="stable"
+    )
 
-    # 移除原DataFrame中所有“compound:nn”依存关系的搭配
-    singleSentenceCollocation = singleSentenceCollocation[
-        singleSentenceCollocation["词语间依存关系"] != "compound:nn"
-    ]
-
-    # 合并处理后的搭配
+    # 移除原DataFrame中所有“compound:nn”依存关系的搭配，合并处理后的搭配
     singleSentenceCollocation = pd.concat(
-        [singleSentenceCollocation, filtered_collocations], ignore_index=True
+        [singleSentenceCollocation[~is_compound], filtered_collocations],
+        ignore_index=True,
     )
 
     return singleSentenceCollocation
@@ -187,6 +183,33 @@ def mergeLibrary(df1, df2):
 
     return merged_df
 
+def newCollocationCounter(vocab=None):
+    '''
+    新建搭配计数器，以(词语1, 词语2, 词语1词性, 词语2词性, 词语间依存关系)的int32编号为键。
+    '''
+    if vocab is None:
+        vocab = CoGenVocab.CoGenVocab()
+    return CoGenVocab.IdCounter(vocab, partial_columns, "搭配频次")
+
+
+def countLibrary(counter, collocation):
+    '''
+    将搭配表累加到计数器中。
+    属性列为partial_columns时每行计1次，为full_columns时按搭配频次累加。
+    '''
+    if set(collocation.columns) not in (set(partial_columns), set(full_columns)):
+        raise ValueError("dataframe的属性列不符合要求")
+
+    return counter.add_frame(collocation)
+
+
+def counterToLibrary(counter):
+    '''
+    将计数器解码为full_columns的搭配库，行按属性列升序排列，与mergeLibrary的结果一致。
+    '''
+    return counter.to_frame().reindex(columns=full_columns)
+
+
 def singleSentenceProcess_only_nn(sentTok, sentPos):
     """
     提取句子中所有的复合名词搭配。
@@ -259,10 +282,128 @@ def singleSentenceProcess_only_nn(sentTok, sentPos):
     return singleSentenceCollocation
 
 
+def flattenArticles(articles):
+    '''
+    将一批json格式文章的所有句子展平为连续数组，便于批量处理。
+
+    :param articles: 文章列表，每篇文章为hanlp结果字典
+    :return: 字典，包含全部词语、词性，以及每条依存弧的依存词全局下标、中心词全局下标、依存关系和所属句子编号
+    '''
+    tok_tasks = "tok/fine"
+    pos_tasks = "pos/pku"
+    dep_tasks = "dep"
+
+    toks, poss = [], []
+    heads, rels = [], []
+    tok_starts, arc_counts = [], []
+
+    offset = 0
+    for article in articles:
+        for sentTok, sentPos, sentDep in zip(
+            article[tok_tasks], article[pos_tasks], article[dep_tasks]
+        ):
+            toks.extend(sentTok)
+            poss.extend(sentPos)
+            heads.extend(dep[0] for dep in sentDep)
+            rels.extend(dep[1] for dep in sentDep)
+            tok_starts.append(offset)
+            arc_counts.append(len(sentDep))
+            offset += len(sentTok)
+
+    tok_arr = np.empty(len(toks), dtype=object)
+    tok_arr[:] = toks
+    pos_arr = np.empty(len(poss), dtype=object)
+    pos_arr[:] = poss
+    rel_arr = np.empty(len(rels), dtype=object)
+    rel_arr[:] = rels
+    head_arr = np.asarray(heads, dtype=np.int64)
+
+    # 每条依存弧所属的句子及其在句子中的位置
+    arc_counts = np.asarray(arc_counts, dtype=np.int64)
+    arc_sent = np.repeat(np.arange(len(arc_counts)), arc_counts)
+    arc_starts = np.cumsum(arc_counts) - arc_counts
+    local_idx = np.arange(len(head_arr)) - arc_starts[arc_sent]
+    tok_base = np.asarray(tok_starts, dtype=np.int64)[arc_sent]
+
+    return {
+        "tok": tok_arr,
+        "pos": pos_arr,
+        "dep_idx": tok_base + local_idx,
+        "head_idx": tok_base + head_arr - 1,
+        "head": head_arr,
+        "rel": rel_arr,
+        "sent": arc_sent,
+    }
+
+
+def batchArticleProcess(articles):
+    '''
+    批量处理多篇json格式文章，一次性得到全部搭配。
+    词语顺序与规则1、规则2、规则3均以数组运算完成，结果与逐句调用singleSentenceProcess一致。
+    '''
+    flat = flattenArticles(articles)
+    tok_arr = flat["tok"]
+    pos_arr = flat["pos"]
+    rel_arr = flat["rel"]
+
+    # 跳过root（中心词下标为0），并应用规则1：去除标点符号和root的依存关系
+    keep = (flat["head"] != 0) & (rel_arr != "punct") & (rel_arr != "root")
+    dep_idx = flat["dep_idx"][keep]
+    head_idx = flat["head_idx"][keep]
+    relation = rel_arr[keep]
+    sent = flat["sent"][keep]
+
+    # 确保word1的索引小于word2
+    idx1 = np.minimum(dep_idx, head_idx)
+    idx2 = np.maximum(dep_idx, head_idx)
+    word1, word2 = tok_arr[idx1], tok_arr[idx2]
+    pos1, pos2 = pos_arr[idx1], pos_arr[idx2]
+
+    # 规则3：将人名与数词用占位符@和#替代
+    word1[pos1 == "nr"] = "@"
+    word1[pos1 == "m"] = "#"
+    word2[pos2 == "nr"] = "@"
+    word2[pos2 == "m"] = "#"
+
+    # 规则2：复合名词只保留中心词前方最近的依存词构成的搭配，选中的搭配按中心词位置追加在所属句子末尾
+    is_nn = relation == "compound:nn"
+    plain_rows = np.flatnonzero(~is_nn)
+    nn_rows = np.flatnonzero(is_nn & (dep_idx < head_idx))
+    # 依存词下标递增，每个中心词最后出现的依存弧即为最近的搭配
+    _, last = np.unique(head_idx[nn_rows][::-1], return_index=True)
+    picked = nn_rows[::-1][last]
+
+    # 按句子顺序排列，每个句子内先普通搭配后复合名词搭配
+    rows = np.concatenate([plain_rows, picked])
+    order_group = np.concatenate(
+        [np.zeros(len(plain_rows), dtype=np.int64), np.ones(len(picked), dtype=np.int64)]
+    )
+    order = np.lexsort((order_group, sent[rows]))
+    rows = rows[order]
+
+    return pd.DataFrame(
+        {
+            "词语1": word1[rows],
+            "词语2": word2[rows],
+            "词语1词性": pos1[rows],
+            "词语2词性": pos2[rows],
+            "词语间依存关系": relation[rows],
+        },
+        columns=partial_columns,
+    )
+
+
 def readArticle_fromJSP(article):
     '''
     对一篇json格式存储的文章进行处理。
     '''
+    return batchArticleProcess([article])
+
+
+def readArticle_fromJSP_bySentence(article):
+    '''
+    逐句处理一篇json格式存储的文章，用于只要复合名词时以及核对批量处理的结果。
+    '''
     tok_tasks = "tok/fine"
     pos_tasks = "pos/pku"
     dep_tasks = "dep"
@@ -295,157 +436,438 @@ def readArticle_fromJSP(article):
     return articleCollocation
 
 
-def corpus_process_and_merge(
-    corpus_of_Json_folder, collocation_Library_folder, existed_coLibrary
+def articleChunkProcess(folder2_path, article_list, collocationCounter, hide_pbar3=True, reader=None):
+    '''
+    处理folder2中的一组文章，并将搭配计入计数器。
+    reader为后台预读的读取器（可选），为None时同步读取。
+    '''
+    folder2 = os.path.basename(folder2_path)
+
+    # 使用内部进度条处理folder2中的每篇文章，json与jsonl分片都按顺序流式读取
+    pbar3 = tqdm(
+        CoGenCorpusIO.open_articles(folder2_path, article_list, reader),
+        desc=f"正在处理'{folder2}'中的文章",
+        leave=False,
+        mininterval=60,
+        disable=hide_pbar3,
+    )
+    for article_file, article_content in pbar3:
+        articleProcess(collocationCounter, article_file, article_content)
+
+    return collocationCounter
+
+
+def articleProcess(collocationCounter, article_file, article_content):
+    '''
+    抽取一篇文章的搭配并计入计数器。
+    '''
+    try:
+        # 使用readArticle函数处理文章
+        articleCollocation = readArticle_fromJSP(article_content)
+        # 将文章的搭配计入计数器
+        countLibrary(collocationCounter, articleCollocation)
+    except MemoryError:
+        print(f"内存错误：处理文件 '{article_file}' 时内存不足。")
+    except Exception as e:
+        print(f"错误：处理文件 '{article_file}' 时出现问题。{str(e)}")
+
+
+def articleChunkWorker(folder2_path, article_list):
+    '''
+    并行模式下工作进程执行的任务：处理一组文章并返回部分计数结果的列表。
+    '''
+    return [articleChunkProcess(folder2_path, article_list, newCollocationCounter())]
+
+
+def buildParallelTasks(corpus_of_Json_folder, folder1_list, chunk_bytes, done_units=()):
+    '''
+    按文件大小将语料切分为并行任务，超过chunk_bytes的folder2按文章切分为多块。
+    任务按大小降序排列，使大任务先被调度，避免最后只剩一个大文件夹在运行。
+
+    :param done_units: 运行日志中已完成的folder1/folder2单元，这些单元不再生成任务
+    :return: 任务列表，每个任务为(任务大小, folder1, folder2路径, 文章列表)
+    '''
+    tasks = []
+    for folder1 in folder1_list:
+        folder1_path = os.path.join(corpus_of_Json_folder, folder1)
+        for folder2 in sorted(os.listdir(folder1_path)):
+            if f"{folder1}/{folder2}" in done_units:
+                continue
+            folder2_path = os.path.join(folder1_path, folder2)
+
+            chunk, chunk_size = [], 0
+            for article_file in os.listdir(folder2_path):
+                file_size = os.path.getsize(os.path.join(folder2_path, article_file))
+                if chunk and chunk_size + file_size > chunk_bytes:
+                    tasks.append((chunk_size, folder1, folder2_path, chunk))
+                    chunk, chunk_size = [], 0
+                chunk.append(article_file)
+                chunk_size += file_size
+            if chunk:
+                tasks.append((chunk_size, folder1, folder2_path, chunk))
+
+    tasks.sort(key=lambda task: task[0], reverse=True)
+    return tasks
+
+
+def readJournal(collocation_Library_folder):
+    '''
+    读取运行日志，不存在时返回None。
+    运行日志记录已保存到增量分片的folder1/folder2单元以及对应的分片文件。
+    '''
+    journal_path = os.path.join(collocation_Library_folder, journal_filename)
+    if not os.path.exists(journal_path):
+        return None
+    with open(journal_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def writeJournal(collocation_Library_folder, journal):
+    '''
+    保存运行日志，先写入临时文件再替换，保证日志始终完整。
+    '''
+    journal_path = os.path.join(collocation_Library_folder, journal_filename)
+    with open(journal_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(journal, f, ensure_ascii=False, indent=4)
+    os.replace(journal_path + ".tmp", journal_path)
+
+
+def saveDeltaShard(
+    collocationCounter, collocation_Library_folder, folder1, journal, units, journal_updates=None
 ):
     '''
-    对多层文件夹的json形式文章进行处理，注意文件夹层级。
+    将上一个检查点之后新增的计数保存为增量分片（不排序），并在运行日志中记录分片及本次计入的单元。
+    分片完整写入后才更新日志，因此日志中的单元与分片始终对应。
+    新的日志先在副本上修改，写入成功后才替换内存中的日志，保存失败时日志保持不变，不会重复计入分片。
+    保存成功后清空计数器，保存失败时计数保留，并入下一个分片，已写入但未记入日志的分片会被删除。
+
+    :param journal_updates: 随本次分片一起写入日志的其他字段（可选）
+    :return: 是否保存成功
     '''
-    datacolumns = full_columns
+    print(f"开始保存截止至 '{folder1}'(包含) 的增量处理结果")
+    shard_path = None
+    try:
+        collocationLibrary_delta = collocationCounter.to_frame(sort_keys=False)
 
-    # 检查corpus_of_Json_folder是否存在
-    if not os.path.exists(corpus_of_Json_folder):
-        print(f"错误：指定的文件夹{corpus_of_Json_folder}不存在。")
-        return
+        shard_path = CoLibFormat.save_library(
+            collocationLibrary_delta,
+            CoLibFormat.unique_path_base(
+                os.path.join(
+                    collocation_Library_folder,
+                    f"{shard_prefix}{len(journal['shards']) + 1:05d}",
+                )
+            ),
+        )
+        collocationCounter.vocab.save(collocation_Library_folder)
+
+        new_journal = dict(journal)
+        new_journal["shards"] = journal["shards"] + [os.path.basename(shard_path)]
+        new_journal["done_units"] = journal["done_units"] + list(units)
+        new_journal.update(journal_updates or {})
+        writeJournal(collocation_Library_folder, new_journal)
+        journal.update(new_journal)
+        collocationCounter.clear()
+        print(f"截止 '{folder1}' 的增量处理结果已保存至{os.path.basename(shard_path)}")
+    except Exception as e:
+        print(f"错误：保存截止 '{folder1}' 的结果时出现问题，这部分结果将并入下一个分片。{str(e)}")
+        if shard_path is not None:
+            CoLibFormat.remove_library(shard_path)
+        return False
+    finally:
+        # 清空collocationLibrary_delta并进行垃圾回收
+        collocationLibrary_delta = None
+        gc.collect()
 
-    # 检查collocation_Library_folder是否存在，不存在则创建
-    if not os.path.exists(collocation_Library_folder):
-        os.makedirs(collocation_Library_folder)
+    return True
 
-    # 初始化一个空的dataframe来存放新的搭配
-    CollocationLibrary_to_be_added = pd.DataFrame(columns=datacolumns)
+
+def removeStrayShards(collocation_Library_folder, journal):
+    '''
+    删除文件夹中未记入运行日志的增量分片（保存分片后、写入日志前中断时留下），继续运行时调用。
+    '''
+    shards = set(journal["shards"])
+    for name in sorted(os.listdir(collocation_Library_folder)):
+        if name.startswith(shard_prefix) and CoLibFormat.is_library_file(name) and name not in shards:
+            print(f"删除未记入运行日志的增量分片{name}")
+            CoLibFormat.remove_library(os.path.join(collocation_Library_folder, name))
+
+
+def compactShards(collocation_Library_folder, journal, vocab=None):
+    '''
+    将已有搭配库与运行日志中的全部增量分片合并为完整的搭配库。
+    '''
+    collocationCounter = newCollocationCounter(vocab)
 
     # 尝试读取已存在的库
+    existed_coLibrary = journal["existed_coLibrary"]
     try:
-        collocationLibrary_existed = pd.read_csv(existed_coLibrary)
+        collocationLibrary_existed = CoLibFormat.load_library(existed_coLibrary)
         print(f"正在将已有搭配库{existed_coLibrary}读入内存。")
 
         # 检查是否具有相同的属性列。
-        if list(CollocationLibrary_to_be_added.columns) == list(
-            collocationLibrary_existed.columns
-        ):
-            # 将新的搭配与已存在的库合并
-            CollocationLibrary_to_be_added = collocationLibrary_existed
-            # 清空collocationLibrary_existed并进行垃圾回收
-            collocationLibrary_existed = None
-            gc.collect()
-
+        if list(full_columns) == list(collocationLibrary_existed.columns):
+            # 将已存在的库计入计数器
+            countLibrary(collocationCounter, collocationLibrary_existed)
         else:
-            print(f"输入的搭配库{existed_coLibrary}属性列不符合要求，属性列应为{datacolumns}。请检查。")
+            print(f"输入的搭配库{existed_coLibrary}属性列不符合要求，属性列应为{full_columns}。请检查。")
 
         print(f"已有搭配库{existed_coLibrary}读取完成。")
 
     except FileNotFoundError:
         # 如果已存在的库不存在，只使用新的搭配
-        print("不存在已有搭配库，正在新建搭配库。")
+        print("不存在已有搭配库，只合并新的搭配。")
 
     except Exception as e:
         print(f"错误：读取已有搭配库{existed_coLibrary}时出现问题，问题如下：{str(e)}")
 
+    # 清空collocationLibrary_existed并进行垃圾回收
+    collocationLibrary_existed = None
+    gc.collect()
+
+    for shard in tqdm(journal["shards"], desc="合并增量分片"):
+        shard_path = os.path.join(collocation_Library_folder, shard)
+        countLibrary(collocationCounter, CoLibFormat.load_library(shard_path))
+
+    return counterToLibrary(collocationCounter)
+
+
+def parallelCount(
+    corpus_of_Json_folder,
+    folder1_list,
+    counters,
+    saveCheckpoint,
+    n_workers,
+    journal,
+    worker=articleChunkWorker,
+    worker_args=(),
+):
+    '''
+    并行模式：多个工作进程处理folder2或文章块，返回的部分计数结果在主进程中归并。
+    某个folder1的全部任务完成后将其计入计数器并保存检查点。
+    folder1中有任务失败（工作进程出错或被终止）时丢弃该folder1的全部部分结果，其单元不记为已完成，继续运行时重新处理。
+    参数含义见countCorpus。
+
+    :return: (尚未成功保存检查点的单元, 有任务失败的folder1列表)
+    '''
+    chunk_bytes = myconfig.parallel_chunk_mb_json2csv * 1024 * 1024
+    tasks = buildParallelTasks(
+        corpus_of_Json_folder, folder1_list, chunk_bytes, set(journal["done_units"])
+    )
+
+    # 记录每个folder1尚未完成的任务数、包含的单元及已完成任务的部分结果
+    remaining = Counter(task[1] for task in tasks)
+    units = {folder1: set() for folder1 in remaining}
+    for _, folder1, folder2_path, _ in tasks:
+        units[folder1].add(f"{folder1}/{os.path.basename(folder2_path)}")
+    pending = {
+        folder1: [
+            CoGenVocab.IdCounter(counter.vocab, counter.columns, counter.freq_column)
+            for counter in counters
+        ]
+        for folder1 in remaining
+    }
+    # 尚未成功保存检查点的单元
+    delta_units = []
+    # 有任务失败的folder1
+    failed = set()
+
+    print(f"并行模式：{n_workers}个工作进程，共{len(tasks)}个任务。")
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = {
+            executor.submit(worker, folder2_path, article_list, *worker_args): folder1
+            for _, folder1, folder2_path, article_list in tasks
+        }
+        for future in tqdm(as_completed(futures), total=len(futures), desc="总体进度"):
+            folder1 = futures[future]
+            try:
+                for folder1Counter, partCounter in zip(pending[folder1], future.result()):
+                    folder1Counter.update(partCounter)
+            except Exception as e:
+                print(f"错误：处理'{folder1}'中的文章时出现问题。{str(e)}")
+                failed.add(folder1)
+
+            remaining[folder1] -= 1
+            if remaining[folder1] == 0:
+                if folder1 in failed:
+                    # 丢弃不完整的结果，避免缺失的计数被记为已完成
+                    pending.pop(folder1)
+                    units.pop(folder1)
+                    continue
+                # 合并folder1的结果并保存检查点
+                for counter, folder1Counter in zip(counters, pending.pop(folder1)):
+                    counter.update(folder1Counter)
+                delta_units.extend(sorted(units.pop(folder1)))
+                if saveCheckpoint(folder1, delta_units):
+                    delta_units = []
+
+    return delta_units, sorted(failed)
+
+
+def countCorpus(
+    corpus_of_Json_folder,
+    journal,
+    counters,
+    chunkProcess,
+    saveCheckpoint,
+    n_workers=1,
+    worker=articleChunkWorker,
+    worker_args=(),
+):
+    '''
+    处理语料中尚未完成的单元并计数，每个folder1处理完成后保存检查点，串行与并行模式共用。
+
+    :param counters: 计数器列表，只生成搭配库时为[搭配计数器]，同时生成关键词库时为[搭配计数器, 关键词计数器]
+    :param chunkProcess: 串行模式处理一组文章的函数，参数为(folder2_path, article_list, reader)，结果计入counters
+    :param saveCheckpoint: 保存检查点的函数，参数为(folder1, 本次计入的单元)，返回是否保存成功
+    :param worker: 并行模式工作进程执行的任务，参数为(folder2_path, article_list, *worker_args)，返回与counters一一对应的部分计数结果
+    :return: 是否全部单元都已计入并保存检查点
+    '''
+    done_units = set(journal["done_units"])
+    # 尚未成功保存检查点的单元
+    delta_units = []
+    # 并行模式下有任务失败的folder1
+    failed = []
+
     # 获取corpus_of_Json_folder中的folder1列表
     folder1_list = os.listdir(corpus_of_Json_folder)
     # 按照文件夹名字升序排序
     folder1_list = sorted(folder1_list)
 
-    # 使用外部进度条处理folder1
-    pbar1 = tqdm(folder1_list, desc="总体进度")
-    for folder1 in pbar1:
+    if n_workers > 1:
+        delta_units, failed = parallelCount(
+            corpus_of_Json_folder,
+            folder1_list,
+            counters,
+            saveCheckpoint,
+            n_workers,
+            journal,
+            worker,
+            worker_args,
+        )
+        folder1_list = []
+
+    # 串行处理时先列出全部待处理的单元：[(folder1, [(folder2路径, 文章列表), ...]), ...]
+    plan = []
+    for folder1 in folder1_list:
         folder1_path = os.path.join(corpus_of_Json_folder, folder1)
         folder2_list = os.listdir(folder1_path)
         # 按照文件夹名字升序排序
         folder2_list = sorted(folder2_list)
+        # 跳过运行日志中已完成的单元
+        folder2_list = [
+            folder2 for folder2 in folder2_list if f"{folder1}/{folder2}" not in done_units
+        ]
+        if folder2_list:
+            folder2_paths = [os.path.join(folder1_path, folder2) for folder2 in folder2_list]
+            plan.append((folder1, [(path, os.listdir(path)) for path in folder2_paths]))
+
+    # 后台预读的读取器按同样的顺序连续读取全部单元
+    reader = CoGenCorpusIO.make_reader() if plan else None
+    if reader is not None:
+        reader.schedule(unit for _, folder2_units in plan for unit in folder2_units)
 
+    # 使用外部进度条处理folder1
+    pbar1 = tqdm(plan, desc="总体进度")
+    for folder1, folder2_units in pbar1:
         # 使用内部进度条处理folder1中的folder2
-        pbar2 = tqdm(folder2_list, desc=f"正在处理'{folder1}'中的文件夹", leave=False)
-        for folder2 in pbar2:
-            folder2_path = os.path.join(folder1_path, folder2)
-            article_list = os.listdir(folder2_path)
-
-            # 初始化一个空的dataframe来存放folder2的搭配
-            folder2_Library_to_be_added = pd.DataFrame(columns=full_columns)
-
-            # 使用内部进度条处理folder2中的每篇文章
-            hide_pbar3 = myconfig.hide_pbar3_json2csv  # 设置变量来控制是否显示pbar3
-
-            pbar3 = tqdm(article_list, desc=f"正在处理'{folder2}'中的文章", leave=False, mininterval=60, disable=hide_pbar3)
-            for article_file in pbar3:
-                # 检查文件扩展名是否为.json
-                if not article_file.endswith(".json"):
-                    print(f"警告：文件 '{article_file}' 不是json格式，已跳过。")
-                    continue  # 跳过当前文件，继续下一个文件
-
-                file_path = os.path.join(folder2_path, article_file)
-
-                # 读取和处理文件
-                try:
-                    with open(file_path, "r", encoding="utf-8") as f:
-                        article_content = json.load(f)
-                        # 使用readArticle函数处理文章
-                        articleCollocation = readArticle_fromJSP(article_content)
-                        # 合并folder2的结果
-                        folder2_Library_to_be_added = mergeLibrary(
-                            folder2_Library_to_be_added, articleCollocation
-                        )
-                except MemoryError:
-                    print(f"内存错误：处理文件 '{article_file}' 时内存不足。")
-                except Exception as e:
-                    print(f"错误：处理文件 '{article_file}' 时出现问题。{str(e)}")
-
-            # 合并folder1的结果
-            try:
-                CollocationLibrary_to_be_added = mergeLibrary(
-                    CollocationLibrary_to_be_added, folder2_Library_to_be_added
-                )
-            except MemoryError:
-                print(f"内存错误：合并folder1 '{folder1}' 的搭配时内存不足。")
-                continue  # 跳过当前folder1，继续下一个folder1
-
-        # 暂时保存当前结果
-        collocationLibrary_new = CollocationLibrary_to_be_added
-        print(f"开始保存截止至 '{folder1}'(包含) 的处理结果")
-        try:
-            # 使用时间戳保存合并后的库
-            timestamp = datetime.now().strftime("%m%d%H%M")
-
-            # 对collocationLibrary_new进行降序排序
-            collocationLibrary_new = collocationLibrary_new.sort_values(
-                by="搭配频次", ascending=False
-            )
+        pbar2 = tqdm(folder2_units, desc=f"正在处理'{folder1}'中的文件夹", leave=False)
+        for folder2_path, article_list in pbar2:
+            chunkProcess(folder2_path, article_list, reader)
 
-            collocationLibrary_new.to_csv(
-                os.path.join(
-                    collocation_Library_folder,
-                    f"collocationLibrary-temp-{timestamp}.csv",
-                ),
-                index=False,
-                encoding="utf-8-sig",
-            )
-            print(f"截止 '{folder1}' 的处理结果已保存至collocationLibrary-temp-{timestamp}.csv")
-        except Exception as e:
-            print(f"错误：保存截止 '{folder1}' 的结果时出现问题。{str(e)}")
-        # 清空collocationLibrary_new并进行垃圾回收
-        collocationLibrary_new = None
-        gc.collect()
+        # 保存检查点
+        delta_units.extend(f"{folder1}/{os.path.basename(path)}" for path, _ in folder2_units)
+        if saveCheckpoint(folder1, delta_units):
+            delta_units = []
 
-    # 保存最终结果
-    print(f"开始保存所有的处理结果")
-    collocationLibrary_new = CollocationLibrary_to_be_added
+    if reader is not None:
+        print(reader.report())
+        reader.close()
 
-    # 使用时间戳保存合并后的库
-    timestamp = datetime.now().strftime("%m%d%H%M")
+    # 保存最终结果前，先保存尚未成功保存的检查点
+    if delta_units and not saveCheckpoint("全部文件夹", delta_units):
+        print("错误：检查点保存失败，最终结果未保存。")
+        return False
+    if failed:
+        print(f"错误：{failed}中有任务处理失败，这些文件夹未计入结果，最终结果未保存。请使用--resume重新处理。")
+        return False
+    return True
+
+
+def corpus_process_and_merge(
+    corpus_of_Json_folder, collocation_Library_folder, existed_coLibrary, n_workers=1, resume=False
+):
+    '''
+    对多层文件夹的json形式文章进行处理，注意文件夹层级。
+    每个folder1处理完成后只保存新增计数的增量分片，全部处理完成后再将已有搭配库与所有分片合并为最终结果。
+    n_workers大于1时使用多进程并行处理，结果与串行处理一致。
+    resume为True时读取运行日志，跳过已保存到分片的单元。
+    '''
+    # 检查corpus_of_Json_folder是否存在
+    if not os.path.exists(corpus_of_Json_folder):
+        print(f"错误：指定的文件夹{corpus_of_Json_folder}不存在。")
+        return
+
+    # 检查collocation_Library_folder是否存在，不存在则创建
+    if not os.path.exists(collocation_Library_folder):
+        os.makedirs(collocation_Library_folder)
+
+    # 读取运行日志，继续运行时沿用日志中的已有搭配库与分片
+    journal = readJournal(collocation_Library_folder) if resume else None
+    if resume and journal is None:
+        print("未找到运行日志，从头开始处理。")
+    if journal is not None:
+        if journal["corpus"] != os.path.abspath(corpus_of_Json_folder):
+            print(f"错误：运行日志对应的语料库为{journal['corpus']}，与当前语料库不一致。")
+            return
+        print(f"从运行日志继续，已完成{len(journal['done_units'])}个单元。")
+        removeStrayShards(collocation_Library_folder, journal)
+    else:
+        journal = {
+            "corpus": os.path.abspath(corpus_of_Json_folder),
+            "existed_coLibrary": existed_coLibrary,
+            "shards": [],
+            "done_units": [],
+        }
+        writeJournal(collocation_Library_folder, journal)
+
+    # 初始化增量计数器来存放上一个检查点之后新增的搭配及其频次
+    collocationCounter = newCollocationCounter(CoGenVocab.load_vocab(collocation_Library_folder))
+
+    def chunkProcess(folder2_path, article_list, reader):
+        articleChunkProcess(
+            folder2_path, article_list, collocationCounter, myconfig.hide_pbar3_json2csv, reader
+        )
+
+    def saveCheckpoint(folder1, units):
+        return saveDeltaShard(
+            collocationCounter, collocation_Library_folder, folder1, journal, units
+        )
+
+    if not countCorpus(
+        corpus_of_Json_folder,
+        journal,
+        [collocationCounter],
+        chunkProcess,
+        saveCheckpoint,
+        n_workers,
+    ):
+        return
 
-    # 对collocationLibrary_new按照搭配频次进行降序排序
-    collocationLibrary_new = collocationLibrary_new.sort_values(
-        by="搭配频次", ascending=False
+    # 合并已有搭配库与全部增量分片
+    print(f"开始合并并保存所有的处理结果")
+    collocationLibrary_new = compactShards(
+        collocation_Library_folder, journal, collocationCounter.vocab
     )
 
     # 语料文件夹名
     partname = myconfig.partname_json2csv
-    collocationLibrary_new.to_csv(
-        os.path.join(collocation_Library_folder, f"collocationLibrary_{partname}.csv"),
-        index=False,
-        encoding="utf-8-sig",
+    # 按照搭配频次降序排序后保存
+    CoLibFormat.save_library(
+        collocationLibrary_new,
+        os.path.join(collocation_Library_folder, f"collocationLibrary_{partname}"),
+        sort_by="搭配频次",
     )
+    collocationCounter.vocab.save(collocation_Library_folder)
 
 
 def main():
@@ -468,6 +890,12 @@ def main():
     # 已有的搭配库存储位置
     yiyoudapeiku = myconfig.existed_colLib_path_json2csv
 
+    parser = argparse.ArgumentParser(description="从json格式的语料生成搭配库")
+    parser.add_argument(
+        "--resume", action="store_true", help="读取运行日志，从上次中断处继续处理"
+    )
+    args = parser.parse_args()
+
     # 性能检测模块前置
     profiler = cProfile.Profile()
     profiler.enable()
@@ -475,7 +903,9 @@ def main():
     # 调用搭配库生成代码
     print("")
     print(f"{partname}开始处理。已有搭配库为：[{yiyoudapeiku}]")
-    corpus_process_and_merge(yuliaoku, dapeikujieguo, yiyoudapeiku)
+    corpus_process_and_merge(
+        yuliaoku, dapeikujieguo, yiyoudapeiku, myconfig.n_workers_json2csv, args.resume
+    )
 
     # 性能检测模块后置
     # 时间戳
@@ -3,13 +3,24 @@ import cProfile
 from datetime import datetime
 import os
 import gc
+import csv
+import heapq
+import itertools
+import shutil
 from tqdm import tqdm
 import CoGenConfig as myconfig
+import CoGenVocab
+import CoLibFormat
 
 # 定义两种情况的属性列
 full_columns = myconfig.full_columns
 partial_columns = myconfig.partial_columns
 
+# external方式读取输入库时每块的行数
+read_chunk_rows = 65536
+# 顺串中一行（Python元组）在内存中占用的估计字节数，用于由内存上限计算按频次排序时每个顺串的行数
+run_row_bytes = 512
+
 def mergeLibrary(df1, df2):
 
     # 两个dataframe的列都需要是是full_columns
@@ -24,10 +35,198 @@ def mergeLibrary(df1, df2):
     return merged_df
 
 
-def corpus_merge(existed_coLibrary, res_coLibrary):
+def writeRun(rows, run_path):
+    '''
+    将已排序的行写入顺串文件（无表头的csv）。
+    '''
+    with open(run_path, "w", encoding="utf-8", newline="") as f:
+        csv.writer(f).writerows(rows)
+
+
+def readRun(run_path):
+    '''
+    逐行读取顺串文件，返回(词语1, 词语2, 词语1词性, 词语2词性, 词语间依存关系, 搭配频次)元组。
+    '''
+    with open(run_path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.reader(f):
+            yield (*row[:-1], int(row[-1]))
+
+
+def sumAdjacent(rows):
+    '''
+    将相邻且属性列相同的行合并，搭配频次相加。
+    '''
+    for key, group in itertools.groupby(rows, key=lambda row: row[:-1]):
+        yield (*key, sum(row[-1] for row in group))
+
+
+def byFreq(row):
+    '''
+    按搭配频次降序、属性列升序排列时的排序键。
+    '''
+    return (-row[-1], row[:-1])
+
+
+def spillKeySortedRuns(file_paths, run_folder, memory_bytes):
+    '''
+    分块读取输入库，缓冲区达到内存上限时按属性列合并、排序，写入顺串。
+    每个文件全部读取成功后才计入结果：当前文件的块单独缓冲并写入自己的顺串，
+    文件中途出错时删除这些顺串并丢弃缓冲的块，与内存方式一样跳过整个文件。
+
+    :return: 顺串文件路径列表
+    '''
+    run_paths = []
+    run_index = itertools.count()
+    # 已读取成功的文件的块，以及当前文件的块
+    committed, committed_bytes = [], 0
+    pending, pending_bytes = [], 0
+
+    def flush(buffer):
+        df = pd.concat(buffer, ignore_index=True)
+        # groupby按属性列的字符串升序排列，与元组的比较顺序一致
+        df = df.groupby(partial_columns, as_index=False, sort=True)["搭配频次"].sum()
+        run_path = os.path.join(run_folder, f"key-{next(run_index):05d}.csv")
+        writeRun(df[full_columns].itertuples(index=False, name=None), run_path)
+        buffer.clear()
+        return run_path
+
+    for file_path in tqdm(file_paths, desc="生成顺串", unit="file"):
+        # 当前文件写入的顺串
+        file_runs = []
+        try:
+            for chunk in CoLibFormat.iter_library(file_path, read_chunk_rows):
+                # 属性列需要是full_columns
+                if set(chunk.columns) != set(full_columns):
+                    raise ValueError("dataframe的属性列不符合要求")
+                # 与内存方式一致，忽略属性列中有缺失值的行
+                chunk = chunk.dropna(subset=partial_columns)
+                chunk = chunk.astype({column: str for column in partial_columns})
+                pending.append(chunk)
+                pending_bytes += chunk.memory_usage(deep=True).sum()
+                # groupby和排序需要额外的内存，缓冲区只使用内存上限的三分之一
+                if committed_bytes + pending_bytes >= memory_bytes // 3:
+                    if committed:
+                        run_paths.append(flush(committed))
+                        committed_bytes = 0
+                    file_runs.append(flush(pending))
+                    pending_bytes = 0
+        except Exception as e:
+            print(f"处理文件{os.path.basename(file_path)}时出错: {e}")
+            # 丢弃该文件已读取的部分
+            for run_path in file_runs:
+                os.remove(run_path)
+            pending.clear()
+            pending_bytes = 0
+            continue
+
+        run_paths.extend(file_runs)
+        committed.extend(pending)
+        committed_bytes += pending_bytes
+        pending.clear()
+        pending_bytes = 0
+
+    if committed:
+        run_paths.append(flush(committed))
+    return run_paths
+
+
+def spillFreqSortedRuns(rows, run_folder, run_rows):
+    '''
+    将行按搭配频次降序分块排序，写入顺串。
+
+    :return: (顺串文件路径列表, 总行数)
+    '''
+    run_paths = []
+    nrows = 0
+    for batch in iter(lambda: list(itertools.islice(rows, run_rows)), []):
+        batch.sort(key=byFreq)
+        run_path = os.path.join(run_folder, f"freq-{len(run_paths):05d}.csv")
+        writeRun(batch, run_path)
+        run_paths.append(run_path)
+        nrows += len(batch)
+    return run_paths, nrows
+
+
+def mergeRuns(run_paths, run_folder, sort_key, max_fan_in):
+    '''
+    用堆对顺串进行多路归并，属性列相同的行搭配频次相加，返回按sort_key排列的行迭代器。
+    顺串数超过max_fan_in时先分组归并为中间顺串，限制同时打开的文件数。
+    '''
+    level = 0
+    while len(run_paths) > max_fan_in:
+        merged_paths = []
+        for i in range(0, len(run_paths), max_fan_in):
+            group = run_paths[i : i + max_fan_in]
+            run_path = os.path.join(run_folder, f"merge-{level}-{len(merged_paths):05d}.csv")
+            writeRun(sumAdjacent(heapq.merge(*map(readRun, group), key=sort_key)), run_path)
+            for path in group:
+                os.remove(path)
+            merged_paths.append(run_path)
+        run_paths = merged_paths
+        level += 1
+
+    return sumAdjacent(heapq.merge(*map(readRun, run_paths), key=sort_key))
+
+
+def rowsToFrames(rows, chunk_rows):
+    '''
+    将行迭代器按chunk_rows行一组转换为dataframe块。
+    '''
+    for batch in iter(lambda: list(itertools.islice(rows, chunk_rows)), []):
+        df = pd.DataFrame(batch, columns=full_columns)
+        df["搭配频次"] = df["搭配频次"].astype("int64")
+        yield df
+
+
+def externalMerge(file_paths, result_path, memory_mb, max_fan_in):
+    '''
+    在限定内存下合并多个搭配库：
+    1. 分块读取输入，按属性列排序后写入顺串；
+    2. 多路归并顺串并累加相同搭配的频次，同时按搭配频次分块排序写入新的顺串；
+    3. 多路归并按频次排序的顺串，逐块写入结果。
+    结果按搭配频次降序排列，频次相同时按属性列升序排列，与内存方式的结果一致。
+
+    :param file_paths: 待合并的库文件路径列表。
+    :param result_path: 不含扩展名的结果保存路径。
+    :param memory_mb: 内存上限（MB）。
+    :param max_fan_in: 一次归并的最大顺串数。
+    :return: 实际保存的文件路径
+    '''
+    memory_bytes = int(memory_mb * 1024 * 1024)
+    run_folder = result_path + "-runs"
+    if os.path.exists(run_folder):
+        shutil.rmtree(run_folder)
+    os.makedirs(run_folder)
+
+    try:
+        key_runs = spillKeySortedRuns(file_paths, run_folder, memory_bytes)
+        print(f"共生成{len(key_runs)}个按属性列排序的顺串，开始归并。")
+        merged_rows = mergeRuns(key_runs, run_folder, lambda row: row[:-1], max_fan_in)
+
+        freq_runs, nrows = spillFreqSortedRuns(
+            merged_rows, run_folder, max(1, memory_bytes // run_row_bytes)
+        )
+        print(f"合并后共{nrows}条搭配，开始按搭配频次排序并保存。")
+        sorted_rows = mergeRuns(freq_runs, run_folder, byFreq, max_fan_in)
+
+        return CoLibFormat.save_library_stream(
+            rowsToFrames(sorted_rows, read_chunk_rows),
+            result_path,
+            full_columns,
+            nrows,
+            sort_by="搭配频次",
+        )
+    finally:
+        shutil.rmtree(run_folder, ignore_errors=True)
+
+
+def corpus_merge(existed_coLibrary, res_coLibrary, merge_mode=None):
     '''
     合并多个已存在的搭配库。
+    merge_mode为"memory"时在内存中合并，为"external"时按内存上限外排序合并，默认使用配置文件中的值。
     '''
+    if merge_mode is None:
+        merge_mode = myconfig.merge_mode_mergeCoLib
     datacolumns = full_columns
 
     # 检查corpus_of_Json_folder是否存在
@@ -40,28 +239,47 @@ def corpus_merge(existed_coLibrary, res_coLibrary):
         print(f"指定的结果文件夹{res_coLibrary}不存在，创建该文件夹。")
         os.makedirs(res_coLibrary)
 
-    # 获取所有csv文件
-    csv_files = [f for f in os.listdir(existed_coLibrary) if f.endswith(".csv")]
+    # 获取所有csv或colib格式的库文件
+    csv_files = [f for f in os.listdir(existed_coLibrary) if CoLibFormat.is_library_file(f)]
     if not csv_files:
-        print(f"错误：指定的语料库文件夹{existed_coLibrary}中没有csv文件。")
+        print(f"错误：指定的语料库文件夹{existed_coLibrary}中没有csv或colib文件。")
         return
 
     # 按照文件夹名字升序排序
     csv_files = sorted(csv_files)
 
-    # 初始化一个空的dataframe来存放新的搭配
-    CollocationLibrary_to_be_added = pd.DataFrame(columns=datacolumns)
-
     print(f"开始合并{existed_coLibrary}中的语料库：{csv_files}")
 
+    if merge_mode == "external":
+        # 时间戳
+        timestamp = datetime.now().strftime("%m%d%H%M")
+        result_path = os.path.join(res_coLibrary, f"coLibrary_merged_result_{timestamp}")
+        try:
+            externalMerge(
+                [os.path.join(existed_coLibrary, csv_file) for csv_file in csv_files],
+                result_path,
+                myconfig.merge_memory_mb_mergeCoLib,
+                myconfig.merge_max_fan_in_mergeCoLib,
+            )
+            print("保存完成。")
+        except Exception as e:
+            print(f"保存结果时出错: {e}")
+        return
+
+    # 初始化以int32编号为键的计数器来存放合并结果，只在保存时解码为dataframe
+    collocationCounter = CoGenVocab.IdCounter(
+        CoGenVocab.load_vocab(res_coLibrary), partial_columns, "搭配频次"
+    )
+
     # 使用进度条显示合并进度
     for csv_file in tqdm(csv_files, desc="合并进度", unit="file"):
         file_path = os.path.join(existed_coLibrary, csv_file)
         try:
-            current_df = pd.read_csv(file_path)
-            CollocationLibrary_to_be_added = mergeLibrary(
-                CollocationLibrary_to_be_added, current_df
-            )
+            current_df = CoLibFormat.load_library(file_path)
+            # 属性列需要是full_columns
+            if set(current_df.columns) != set(datacolumns):
+                raise ValueError("dataframe的属性列不符合要求")
+            collocationCounter.add_frame(current_df)
             del current_df  # 删除当前的dataframe
             gc.collect()  # 清理内存
         except Exception as e:
@@ -70,26 +288,16 @@ def corpus_merge(existed_coLibrary, res_coLibrary):
 
     # 保存最终结果
     print(f"开始保存所有的处理结果。")
-    collocationLibrary_new = CollocationLibrary_to_be_added
+    collocationLibrary_new = collocationCounter.to_frame()
 
     # 时间戳
     timestamp = datetime.now().strftime("%m%d%H%M")
     # 保存合并后的结果
-    result_path = os.path.join(
-        res_coLibrary, f"coLibrary_merged_result_{timestamp}.csv"
-    )
+    result_path = os.path.join(res_coLibrary, f"coLibrary_merged_result_{timestamp}")
     try:
-        # 对collocationLibrary_new按照搭配频次进行降序排序
-        collocationLibrary_new = collocationLibrary_new.sort_values(
-            by="搭配频次", ascending=False
-        )
-        print("按照搭配频次进行降序排序，已完成。")
-
-        collocationLibrary_new.to_csv(
-            result_path,
-            index=False,
-            encoding="utf-8-sig",
-        )
+        # 对collocationLibrary_new按照搭配频次进行降序排序后保存
+        CoLibFormat.save_library(collocationLibrary_new, result_path, sort_by="搭配频次")
+        collocationCounter.vocab.save(res_coLibrary)
         print("保存完成。")
     except Exception as e:
         print(f"保存结果时出错: {e}")
@@ -6,93 +6,331 @@ import time
 import os
 from datetime import datetime
 import cProfile
-import json
-import re
 import CoGenConfig as myconfig
+import CoGenAnnotationCache
+import CoGenCorpusIO
+import CoGenSentenceSplit
 
 # 本版本的更新要点：1.修改了分句规则，分句时句子终结符不再出现。2.更换了使用的hanlp模型
 
-# 定义一个分隔符，用于替换缩写
-_SEPARATOR = r"@"
-# 定义一个句子识别的正则表达式，能够找到句尾符号或者行尾
-_RE_SENTENCE = re.compile(r"(\S.+?[.!?])(?=\s+|$)|(\S.+?)(?=[\n]|$)", re.UNICODE)
-# 定义一个匹配缩写的正则表达式，如“Mr.”
-_AB_SENIOR = re.compile(r"([A-Z][a-z]{1,2}\.)\s(\w)", re.UNICODE)
-# 定义一个匹配连续缩写的正则表达式，如“U.S.A.”
-_AB_ACRONYM = re.compile(r"(\.[a-zA-Z]\.)\s(\w)", re.UNICODE)
-# 定义用于还原缩写的正则表达式
-_UNDO_AB_SENIOR = re.compile(r"([A-Z][a-z]{1,2}\.)" + _SEPARATOR + r"(\w)", re.UNICODE)
-_UNDO_AB_ACRONYM = re.compile(r"(\.[a-zA-Z]\.)" + _SEPARATOR + r"(\w)", re.UNICODE)
-
-
-def _replace_with_separator(text, separator, regexs):
-    # 将匹配到的模式替换为分隔符
-    replacement = r"\1" + separator + r"\2"
-    result = text
-    for regex in regexs:
-        result = regex.sub(replacement, result)
-    return result
-
-
-def custom_split_sentence(text, best=True):
+# 自定义规则分句，实现见CoGenSentenceSplit.py
+custom_split_sentence = CoGenSentenceSplit.split_sentence
+
+
+# 执行的任务标签
+tok_tasks = "tok/fine"
+pos_tasks = "pos/pku"
+dep_tasks = "dep"
+hanlp_tasks = [tok_tasks, pos_tasks, dep_tasks]
+
+
+def makeBatches(lengths, token_budget):
+    '''
+    按句子长度分桶组批：句子按长度排序后依次装入批次，使同一批内的句子长度相近，
+    每批的 最长句子字数×句子数 不超过token_budget（单个句子超过上限时单独成批）。
+
+    :param lengths: 每个句子的字数。
+    :return: 每批句子的下标列表。
+    '''
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    batches, batch = [], []
+    for i in order:
+        # 句子按长度升序，当前句子即为加入后的最长句子
+        if batch and lengths[i] * (len(batch) + 1) > token_budget:
+            batches.append(batch)
+            batch = []
+        batch.append(i)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def annotateBatch(HanLP, sentences, batch, results, failed):
     '''
-    自定义分句，将指定句子终结符替换为换行符。
-    句子终结符包括([。！!？?,，:：；;]|\s)
+    对一批句子执行hanlp任务，结果按句子下标写入results。
+    出错时将该批对半拆分后重试，单个句子仍出错时将其下标记入failed。
     '''
-    # 使用正则表达式替换所有的句子终结符为换行符，包括空格
-    text = re.sub(r"([。！!？?,，:：；;]|\s)", r"\n", text)
-    # 对于六个连续句点构成的省略号，替换为换行符
-    text = re.sub(r"(\.{6})", r"\n", text)
-    # 对于两个连续省略号字符构成的省略号，替换为换行符
-    text = re.sub(r"(…{2})", r"\n", text)
-
-    for chunk in text.split("\n"):  # 通过换行符来分割文本
-        chunk = chunk.strip()
-        if not chunk:  # 如果行为空，则忽略
-            continue
-        if not best:  # 如果不需要最佳分割，则直接返回结果
+    try:
+        doc = HanLP([sentences[i] for i in batch], tasks=hanlp_tasks)
+        for task in hanlp_tasks:
+            for i, value in zip(batch, doc[task]):
+                results[task][i] = value
+        return
+    except RuntimeError as e:
+        if "CUDA out of memory" not in str(e):
+            raise Exception("Unexpected RuntimeError")  # 如果是其他类型的RuntimeError，重新抛出
+        error = "CUDA内存不足"
+    except RecursionError:
+        error = "递归错误"
+    except Exception as e:
+        error = str(e)
+
+    if len(batch) == 1:
+        print(f"错误：标注句子 '{sentences[batch[0]][:20]}' 时出现问题。{error}")
+        failed.add(batch[0])
+        return
+    half = len(batch) // 2
+    annotateBatch(HanLP, sentences, batch[:half], results, failed)
+    annotateBatch(HanLP, sentences, batch[half:], results, failed)
+
+
+def annotateSentences(HanLP, unique_sentences, token_budget, cache=None):
+    '''
+    对一组互不相同的句子执行hanlp任务：命中缓存的句子直接使用缓存结果，其余句子按长度分桶组批送入模型。
+
+    :param unique_sentences: 互不相同的句子列表。
+    :param token_budget: 每批的 最长句子字数×句子数 上限。
+    :param cache: 标注缓存（可选），新标注的句子写入缓存。
+    :return: {句子: {任务: 结果}}，标注失败的句子不在其中。
+    '''
+    sentence_results = cache.get_many(unique_sentences) if cache is not None else {}
+    sentences = [sentence for sentence in unique_sentences if sentence not in sentence_results]
+
+    # 分词，词性标注，句法分析
+    results = {task: [None] * len(sentences) for task in hanlp_tasks}
+    failed = set()
+    for batch in makeBatches([len(sentence) for sentence in sentences], token_budget):
+        annotateBatch(HanLP, sentences, batch, results, failed)
+
+    new_results = {
+        sentence: {task: results[task][i] for task in hanlp_tasks}
+        for i, sentence in enumerate(sentences)
+        if i not in failed
+    }
+    if cache is not None and new_results:
+        cache.put_many(new_results)
+    sentence_results.update(new_results)
+    return sentence_results
+
+
+def annotateArticles(HanLP, articles, token_budget, cache=None):
+    '''
+    跨文章批量执行hanlp任务：先对每篇文章分句并去除重复的句子，再将需要标注的句子按长度分桶组批送入模型，
+    最后按原句子顺序拆回各篇文章。
+
+    :param articles: 文章文本列表。
+    :param token_budget: 每批的 最长句子字数×句子数 上限。
+    :param cache: 标注缓存（可选），命中的句子不再送入模型，新标注的句子写入缓存。
+    :return: 与articles一一对应的结果列表，有句子标注失败的文章对应None。
+    '''
+    # 自定义规则分句
+    article_sentences = CoGenSentenceSplit.split_sentences(articles)
+    # 重复出现的句子只标注一次
+    unique_sentences = list(
+        dict.fromkeys(sentence for sents in article_sentences for sentence in sents)
+    )
+    sentence_results = annotateSentences(HanLP, unique_sentences, token_budget, cache)
+
+    article_results = []
+    for sents in article_sentences:
+        if all(sentence in sentence_results for sentence in sents):
+            article_results.append(
+                {task: [sentence_results[sentence][task] for sentence in sents] for task in hanlp_tasks}
+            )
+        else:
+            article_results.append(None)
+    return article_results
+
+
+def iterSentenceChunks(sentences, max_sentences, max_chars):
+    '''
+    将句子按原顺序在句子边界处切分为块，每块不超过max_sentences个句子、不超过max_chars字
+    （单个句子超过max_chars时单独成块）。
+    '''
+    chunk, chunk_chars = [], 0
+    for sentence in sentences:
+        if chunk and (len(chunk) >= max_sentences or chunk_chars + len(sentence) > max_chars):
             yield chunk
-            continue
-        # 处理缩写，防止它们被错误地分割
-        processed = _replace_with_separator(
-            chunk, _SEPARATOR, [_AB_SENIOR, _AB_ACRONYM]
+            chunk, chunk_chars = [], 0
+        chunk.append(sentence)
+        chunk_chars += len(sentence)
+    if chunk:
+        yield chunk
+
+
+def annotateLongArticle(HanLP, article, token_budget, max_sentences, max_chars, cache=None):
+    '''
+    分块标注一篇文章：在句子边界处切分为不超过max_sentences个句子、max_chars字的块，
+    逐块标注后按原顺序拼接为一篇文章的结果。每次送入模型的数据量与文章长度无关。
+
+    :return: 文章的结果，有句子标注失败时返回None。
+    '''
+    article_result = {task: [] for task in hanlp_tasks}
+    for chunk in iterSentenceChunks(custom_split_sentence(article), max_sentences, max_chars):
+        sentence_results = annotateSentences(
+            HanLP, list(dict.fromkeys(chunk)), token_budget, cache
         )
-        sents = list(_RE_SENTENCE.finditer(processed))  # 查找所有句子
-        if not sents:  # 如果没有找到句子，则直接返回
-            yield chunk
-            continue
-        for sentence in sents:  # 对找到的每个句子，还原缩写后返回
-            sentence = _replace_with_separator(
-                sentence.group(), r" ", [_UNDO_AB_SENIOR, _UNDO_AB_ACRONYM]
-            )
-            yield sentence
+        if not all(sentence in sentence_results for sentence in chunk):
+            return None
+        for task in hanlp_tasks:
+            article_result[task].extend(sentence_results[sentence][task] for sentence in chunk)
+    return article_result
 
 
 def readArticle_withHanLP_tok_fine(article, HanLP):
     '''
-    执行hanlp的任务，得到结果
+    执行hanlp的任务，得到单篇文章的结果。文章按句子边界分块标注，长文章也不会一次送入模型。
     '''
-    # 执行的任务标签
-    tok_tasks = "tok/fine"
-    pos_tasks = "pos/pku"
-    dep_tasks = "dep"
-
-    # 为hanlp添加任务，先分句，然后分词，词性标注和依存句法分析
-    articleTok = (
-        hanlp.pipeline()
-        .append(custom_split_sentence)  # 自定义规则分句
-        .append(HanLP, tasks=[tok_tasks, pos_tasks, dep_tasks])  # 分词，词性标注，句法分析
+    SSentencList = annotateLongArticle(
+        HanLP,
+        article,
+        myconfig.batch_token_budget_txt2json,
+        myconfig.chunk_max_sentences_txt2json,
+        myconfig.chunk_max_chars_txt2json,
     )
-
-    # 执行hanlp任务，得到结果
-    SSentencList = articleTok(article)
+    if SSentencList is None:
+        raise Exception("文章中有句子标注失败")
 
     return SSentencList
 
 
-def articleFolder_2jsonFolder(HanLP, articleFolder, jsonFolder):
+class ArticleBatcher:
+    '''
+    收集待标注的文章，累计字数达到window_chars时跨文章批量标注，并保存结果。
+    output_format为"json"时每篇文章保存为一个json文件；为"jsonl"时写入结果文件夹中的jsonl分片，
+    每个分片不超过shard_bytes（为0时每个结果文件夹一个分片）。
+    结果文件夹中应有的文章全部保存成功后，为该文件夹写入完成标记。
+    字数不少于long_article_chars的长文章不参与跨文章组批，而是单独分块标注。
+    '''
+
+    def __init__(self, HanLP, token_budget, window_chars, cache=None, output_format="json", shard_bytes=0):
+        self.HanLP = HanLP
+        self.token_budget = token_budget
+        self.window_chars = window_chars
+        self.cache = cache
+        self.output_format = output_format
+        self.shard_bytes = shard_bytes
+        # 各结果文件夹正在写入的jsonl分片
+        self.writers = {}
+        # 各结果文件夹中尚未保存成功的文章
+        self.remaining = {}
+        # 待标注的文章：(文章文件名, 结果文件夹, 文章内容)
+        self.pending = []
+        self.pending_chars = 0
+
+    def completed_articles(self, jsonFolder):
+        '''
+        返回结果文件夹中已经完整保存的文章文件名。
+        json文件先写入临时文件再重命名，因此已存在的json文件都是完整的。
+        '''
+        if self.output_format == "jsonl":
+            names, next_index = CoGenCorpusIO.scan_jsonl_shards(jsonFolder)
+            # 之后的结果写入新的分片
+            self.writers[jsonFolder] = CoGenCorpusIO.JsonlShardWriter(
+                jsonFolder, self.shard_bytes, next_index
+            )
+            return names
+        return {
+            f[: -len(CoGenCorpusIO.json_suffix)]
+            for f in os.listdir(jsonFolder)
+            if f.endswith(CoGenCorpusIO.json_suffix)
+        }
+
+    def expect(self, jsonFolder, article_files):
+        '''
+        登记结果文件夹中尚未完成的文章，全部保存成功后写入完成标记。
+        '''
+        self.remaining[jsonFolder] = set(article_files)
+        self.check_done(jsonFolder)
+
+    def check_done(self, jsonFolder):
+        if not self.remaining.get(jsonFolder, True):
+            del self.remaining[jsonFolder]
+            writer = self.writers.pop(jsonFolder, None)
+            if writer is not None:
+                writer.close()
+            CoGenCorpusIO.mark_folder_done(jsonFolder)
+
+    def add(self, article_file, jsonFolder, article_content):
+        if len(article_content) >= myconfig.long_article_chars_txt2json:
+            self.annotate_long(article_file, jsonFolder, article_content)
+            return
+        self.pending.append((article_file, jsonFolder, article_content))
+        self.pending_chars += len(article_content)
+        if self.pending_chars >= self.window_chars:
+            self.flush()
+
+    def flush(self):
+        '''
+        标注所有待标注的文章并保存结果。
+        标注时出现非内存不足的RuntimeError会向上抛出并中止运行，此时待标注的文章保留在pending中。
+        '''
+        if not self.pending:
+            return
+        pending = self.pending
+
+        article_results = annotateArticles(
+            self.HanLP,
+            [article_content for _, _, article_content in pending],
+            self.token_budget,
+            self.cache,
+        )
+        self.pending, self.pending_chars = [], 0
+        for (article_file, jsonFolder, _), article_result in zip(pending, article_results):
+            self.save_result(article_file, jsonFolder, article_result)
+
+    def annotate_long(self, article_file, jsonFolder, article_content):
+        '''
+        单独分块标注一篇长文章并保存结果。
+        '''
+        article_result = annotateLongArticle(
+            self.HanLP,
+            article_content,
+            self.token_budget,
+            myconfig.chunk_max_sentences_txt2json,
+            myconfig.chunk_max_chars_txt2json,
+            self.cache,
+        )
+        self.save_result(article_file, jsonFolder, article_result)
+
+    def save_result(self, article_file, jsonFolder, article_result):
+        '''
+        保存一篇文章的结果，全部文章保存成功的文件夹写入完成标记。
+        '''
+        if article_result is None:
+            print(f"错误：处理文件 '{article_file}' 时出现问题，已跳过。")
+            return
+        try:
+            self.save(article_file, jsonFolder, article_result)
+        except Exception as e:
+            print(f"错误：保存文件 '{article_file}' 的结果时出现问题。{str(e)}")
+            return
+        if jsonFolder in self.remaining:
+            self.remaining[jsonFolder].discard(article_file)
+            self.check_done(jsonFolder)
+
+    def save(self, article_file, jsonFolder, article_result):
+        '''
+        按输出格式保存一篇文章的结果。
+        '''
+        if self.output_format == "jsonl":
+            writer = self.writers.get(jsonFolder)
+            if writer is None:
+                writer = CoGenCorpusIO.JsonlShardWriter(jsonFolder, self.shard_bytes)
+                self.writers[jsonFolder] = writer
+            writer.write(article_file, article_result)
+        else:
+            # 将处理结果保存为json文件，先写入临时文件再重命名
+            result_file_path = os.path.join(jsonFolder, f"{article_file}.json")
+            CoGenCorpusIO.write_json_atomic(result_file_path, article_result)
+
+    def finish(self):
+        '''
+        标注剩余的文章，并关闭所有jsonl分片。仍有文章未成功保存的文件夹不会写入完成标记。
+        '''
+        self.flush()
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+        for jsonFolder, article_files in self.remaining.items():
+            print(f"警告：'{jsonFolder}'中有{len(article_files)}篇文章未处理成功，下次运行时会重新处理。")
+        self.remaining = {}
+
+
+def articleFolder_2jsonFolder(batcher, articleFolder, jsonFolder):
     '''
-    将文件夹的的所有文章进行hanlp处理，并存储json文件到相应的文件夹中。
+    将文件夹的的所有文章加入批量标注，结果存储到相应的文件夹中。
+    已经带有完成标记的文件夹直接跳过；其余文件夹只处理尚未完整保存的文章。
     '''
     # 检查文章所在的文件夹是否存在
     if not os.path.exists(articleFolder):
@@ -102,47 +340,59 @@ def articleFolder_2jsonFolder(HanLP, articleFolder, jsonFolder):
     if not os.path.exists(jsonFolder):
         os.makedirs(jsonFolder)
 
+    # 已完成的文件夹直接跳过
+    if CoGenCorpusIO.is_folder_done(jsonFolder):
+        return
+
     # 获取文章文件夹中的文件列表
     file_list = os.listdir(articleFolder)
 
     # 按照文件名字升序排序
     file_list = sorted(file_list)
 
+    # 检查文件扩展名是否为.txt
     for article_file in file_list:
-        # 检查文件扩展名是否为.txt
         if not article_file.endswith(".txt"):
             print(f"警告：文件 '{article_file}' 不是txt格式,已跳过。")
-            continue  # 跳过当前文件，继续下一个文件
+    file_list = [article_file for article_file in file_list if article_file.endswith(".txt")]
+
+    # 跳过已经完整保存的文章
+    completed = batcher.completed_articles(jsonFolder)
+    file_list = [article_file for article_file in file_list if article_file not in completed]
+    batcher.expect(jsonFolder, file_list)
 
+    for article_file in file_list:
         file_path = os.path.join(articleFolder, article_file)
 
-        # 读取和处理文件
+        # 读取文件
         try:
             with open(file_path, "r", encoding="utf-8") as f:
                 article_content = f.read()
-                # 使用readArticle_withHanLP函数处理文章
-                article_result = readArticle_withHanLP_tok_fine(article_content, HanLP)
-                # 将处理结果保存为json文件
-                result_file_path = os.path.join(jsonFolder, f"{article_file}.json")
-                with open(result_file_path, "w", encoding="utf-8") as result_file:
-                    json.dump(article_result, result_file, ensure_ascii=False, indent=4)
-        except RecursionError:
-            print(f"递归错误：处理文件 '{article_file}' 时出现问题。")
-            continue  # 跳过当前文件，继续处理下一个文件
-        except RuntimeError as e:
-            if "CUDA out of memory" in str(e):
-                print(f"错误：处理文件 '{article_file}' 时出现问题。CUDA内存不足，跳过此文件。")
-                continue  # 跳过当前文件，继续处理下一个文件
-            else:
-                raise Exception("Unexpected RuntimeError")  # 如果是其他类型的RuntimeError，重新抛出
         except Exception as e:
             print(f"错误：处理文件 '{article_file}' 时出现问题。{str(e)}")
             continue  # 跳过当前文件，继续处理下一个文件
 
+        # 加入批量标注，标注中的意外错误（非内存不足的RuntimeError）会中止运行，不在此处跳过
+        batcher.add(article_file, jsonFolder, article_content)
+
 
-def corpus_2json(HanLP, corpus_folder, corpus_json_folder):
+def isFolder1Done(corpus_folder_1_path, json_folder_1):
+    '''
+    判断folder1是否已经处理完成：其中每个folder2对应的结果文件夹都带有完成标记。
+    '''
+    if not os.path.exists(json_folder_1):
+        return False
+    return all(
+        CoGenCorpusIO.is_folder_done(os.path.join(json_folder_1, f + "-json"))
+        for f in os.listdir(corpus_folder_1_path)
+        if os.path.isdir(os.path.join(corpus_folder_1_path, f))
+    )
+
+
+def corpus_2json(HanLP, corpus_folder, corpus_json_folder, cache=None):
     '''
     进行多层文件夹处理过程并使用进度条可视化。注意文件夹的层级。
+    cache为标注缓存（可选），已缓存的句子不再送入模型。
     '''
     # 检查corpus_folder是否存在，不存在则报错
     if not os.path.exists(corpus_folder):
@@ -152,16 +402,14 @@ def corpus_2json(HanLP, corpus_folder, corpus_json_folder):
     if not os.path.exists(corpus_json_folder):
         os.makedirs(corpus_json_folder)
 
-    # 如果corpus_json_folder存在，获取其内部的文件夹列表
-    corpus_folder_1_list_done = []
-    if os.path.exists(corpus_json_folder):
-        # 获取文件夹列表并去除尾部的“-json”
-        corpus_folder_1_list_done = [
-            f.replace("-json", "")
-            for f in os.listdir(corpus_json_folder)
-            if os.path.isdir(os.path.join(corpus_json_folder, f))
-        ]
-        print(f"以下文件夹已经处理过了，本次处理会跳过：{corpus_folder_1_list_done}")
+    # 所有folder2都带有完成标记的folder1已经处理完成；其余folder1中未完成的文章会继续处理
+    corpus_folder_1_list_done = [
+        f
+        for f in os.listdir(corpus_folder)
+        if os.path.isdir(os.path.join(corpus_folder, f))
+        and isFolder1Done(os.path.join(corpus_folder, f), os.path.join(corpus_json_folder, f + "-json"))
+    ]
+    print(f"以下文件夹已经处理过了，本次处理会跳过：{corpus_folder_1_list_done}")
 
     corpus_folder_1_list_error = []
     print(f"以下文件夹出现bug,本次处理会跳过：{corpus_folder_1_list_error}")
@@ -177,6 +425,16 @@ def corpus_2json(HanLP, corpus_folder, corpus_json_folder):
     # 按照文件夹名字升序排序
     corpus_folder_1_list = sorted(corpus_folder_1_list)
 
+    # 所有文章共用一个批量标注器，跨文章、跨文件夹组批
+    batcher = ArticleBatcher(
+        HanLP,
+        myconfig.batch_token_budget_txt2json,
+        myconfig.batch_window_chars_txt2json,
+        cache,
+        myconfig.output_format_txt2json,
+        myconfig.jsonl_shard_mb_txt2json * 1024 * 1024,
+    )
+
     with tqdm(total=len(corpus_folder_1_list), desc="总体进度", position=0) as pbar_outer:
         for folder_1 in corpus_folder_1_list:
             json_folder_1 = os.path.join(corpus_json_folder, folder_1 + "-json")
@@ -205,12 +463,16 @@ def corpus_2json(HanLP, corpus_folder, corpus_json_folder):
                         os.makedirs(json_folder_2)
 
                     articleFolder_2jsonFolder(
-                        HanLP,
+                        batcher,
                         os.path.join(corpus_folder_1_path, folder_2),
                         json_folder_2,
                     )
                     pbar_inner.update(1)  # 更新内部进度条
 
+            # folder1处理完成前标注剩余的文章，成功保存全部文章的文件夹会写入完成标记
+            batcher.finish()
+            if cache is not None:
+                print(cache.report())
             pbar_outer.update(1)  # 更新外部进度条
 
 
@@ -220,9 +482,17 @@ def main():
     #     hanlp.pretrained.mtl.CLOSE_TOK_POS_NER_SRL_DEP_SDP_CON_ELECTRA_BASE_ZH
     # )
     # 加载模型
-    HanLP = hanlp.load(
-        hanlp.pretrained.mtl.CLOSE_TOK_POS_NER_SRL_UDEP_SDP_CON_ELECTRA_SMALL_ZH
-    )
+    model_name = hanlp.pretrained.mtl.CLOSE_TOK_POS_NER_SRL_UDEP_SDP_CON_ELECTRA_SMALL_ZH
+    HanLP = hanlp.load(model_name)
+
+    # 标注缓存，按模型和任务区分缓存的结果
+    cache = None
+    if myconfig.annotation_cache_path_txt2json:
+        cache = CoGenAnnotationCache.AnnotationCache(
+            myconfig.annotation_cache_path_txt2json,
+            model_name + "|" + ",".join(hanlp_tasks),
+            myconfig.annotation_cache_max_mb_txt2json,
+        )
 
     # 资源存放根文件夹
     rootname = myconfig.rootname_txt2json
@@ -241,7 +511,9 @@ def main():
     profiler = cProfile.Profile()
     profiler.enable()
 
-    corpus_2json(HanLP, yuliaoku, jieguo)
+    corpus_2json(HanLP, yuliaoku, jieguo, cache)
+    if cache is not None:
+        cache.close()
 
     # 时间戳
     timestamp = datetime.now().strftime("%m%d%H%M")
@@ -0,0 +1,86 @@
+import random
+import time
+import warnings
+import pandas as pd
+import CollocationGen_v3 as colgen
+
+# 对比folder2内逐篇mergeLibrary与计数器累加的耗时随文章数的增长情况
+# 使用方法：python bench_CollocationCounter.py
+
+# 合成语料使用的词表、词性与依存关系
+bench_words = [f"词{i}" for i in range(5000)]
+bench_pos = ["n", "v", "a", "vn", "an", "d", "nr", "m", "w"]
+bench_rels = ["nsubj", "dobj", "amod", "nmod", "advmod", "compound:nn", "punct", "root"]
+
+
+def make_article(rng, n_sentences=20, sentence_len=15):
+    '''
+    生成一篇与hanlp结果结构相同的合成文章。
+    '''
+    article = {"tok/fine": [], "pos/pku": [], "dep": []}
+    for _ in range(n_sentences):
+        article["tok/fine"].append(rng.choices(bench_words, k=sentence_len))
+        article["pos/pku"].append(rng.choices(bench_pos, k=sentence_len))
+        article["dep"].append(
+            [[rng.randint(0, sentence_len), rng.choice(bench_rels)] for _ in range(sentence_len)]
+        )
+    return article
+
+
+def bench_mergeLibrary(article_collocations):
+    '''
+    原方式：每篇文章都与整个folder2搭配库拼接并groupby。
+    '''
+    folder2_Library = pd.DataFrame(columns=colgen.full_columns)
+    for articleCollocation in article_collocations:
+        folder2_Library = colgen.mergeLibrary(folder2_Library, articleCollocation.copy())
+    return folder2_Library
+
+
+def bench_counter(article_collocations):
+    '''
+    新方式：文章结果累加到计数器，最后一次性解码为dataframe。
+    '''
+    counter = colgen.newCollocationCounter()
+    for articleCollocation in article_collocations:
+        colgen.countLibrary(counter, articleCollocation)
+    return colgen.counterToLibrary(counter)
+
+
+def sorted_library(df):
+    '''
+    将搭配库按属性列排序并统一列顺序与类型，用于逐行比较两种方式的结果。
+    '''
+    df = df.reindex(columns=colgen.full_columns)
+    df = df.astype({column: str for column in colgen.partial_columns}).astype({"搭配频次": "int64"})
+    return df.sort_values(by=colgen.partial_columns, kind="stable").reset_index(drop=True)
+
+
+def main():
+    warnings.simplefilter("ignore")
+    rng = random.Random(0)
+    sizes = [100, 200, 400, 800]
+    articles = [make_article(rng) for _ in range(max(sizes))]
+    article_collocations = [colgen.readArticle_fromJSP(article) for article in articles]
+
+    print(f"{'文章数':>8}{'mergeLibrary(s)':>18}{'每篇(ms)':>12}{'计数器(s)':>14}{'每篇(ms)':>12}")
+    for n in sizes:
+        start = time.perf_counter()
+        merged = bench_mergeLibrary(article_collocations[:n])
+        merge_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        counted = bench_counter(article_collocations[:n])
+        counter_time = time.perf_counter() - start
+
+        # 两种方式的结果必须逐行一致
+        pd.testing.assert_frame_equal(sorted_library(merged), sorted_library(counted))
+
+        print(
+            f"{n:>8}{merge_time:>18.3f}{merge_time / n * 1000:>12.2f}"
+            f"{counter_time:>14.3f}{counter_time / n * 1000:>12.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
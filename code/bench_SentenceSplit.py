@@ -0,0 +1,110 @@
+import os
+import sys
+import random
+import time
+import CoGenSentenceSplit
+
+# 检查split_sentence与原分句实现legacy_split_sentence的结果是否一致，并对比两者的速度
+# 使用方法：python bench_SentenceSplit.py [语料库文件夹]
+# 给出语料库文件夹时，额外使用其中全部txt文件做一致性检查和速度对比
+
+# 合成语料使用的字符：中文、英文缩写、各种句子终结符、省略号、空白字符与"@"
+bench_pieces = (
+    list("的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经")
+    + ["Mr.", "Dr.", "Mrs.", "U.S.A.", ".e.", "Mr.@J", "U.S.@A", ".a.@b", "@", "@@", "hello", "world", "3.14"]
+    + list("。！!？?,，:：；;") + [".", "..", "......", ".......", "…", "……", "………"]
+    + [" ", "  ", "\n", "\t", "\r\n", "　", "\xa0", " ", "\x1c"]
+)
+# 中文为主的文章使用的句子终结符
+cjk_separators = list("。，！？；：")
+
+
+def make_mixed_text(rng, length):
+    '''
+    生成混有英文缩写、省略号、各种空白字符和"@"的文本，用于一致性检查。
+    '''
+    return "".join(rng.choice(bench_pieces) for _ in range(length))
+
+
+def make_cjk_text(rng, n_sentences, sentence_len=15):
+    '''
+    生成以中文为主的文章，用于速度对比。
+    '''
+    cjk_chars = bench_pieces[:60]
+    return "".join(
+        "".join(rng.choices(cjk_chars, k=rng.randint(1, 2 * sentence_len))) + rng.choice(cjk_separators)
+        for _ in range(n_sentences)
+    )
+
+
+def read_corpus(corpus_folder):
+    '''
+    读取语料库文件夹中的全部txt文件。
+    '''
+    texts = []
+    for root, _, files in os.walk(corpus_folder):
+        for file_name in sorted(files):
+            if file_name.endswith(".txt"):
+                with open(os.path.join(root, file_name), "r", encoding="utf-8") as f:
+                    texts.append(f.read())
+    return texts
+
+
+def check_same(texts):
+    '''
+    逐篇比较两种实现的分句结果，返回不一致的篇数。
+    '''
+    mismatches = 0
+    for best in (True, False):
+        results = CoGenSentenceSplit.split_sentences(texts, best)
+        for text, sentences in zip(texts, results):
+            if sentences != list(CoGenSentenceSplit.legacy_split_sentence(text, best)):
+                mismatches += 1
+                if mismatches <= 5:
+                    print(f"不一致（best={best}）：{text[:50]!r}")
+    return mismatches
+
+
+def bench(name, texts):
+    '''
+    对比两种实现分句的耗时。
+    '''
+    n_chars = sum(len(text) for text in texts)
+
+    start = time.perf_counter()
+    for text in texts:
+        list(CoGenSentenceSplit.legacy_split_sentence(text))
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    CoGenSentenceSplit.split_sentences(texts)
+    new_time = time.perf_counter() - start
+
+    print(
+        f"{name:>10}{len(texts):>8}{n_chars / 1e6:>10.2f}"
+        f"{n_chars / legacy_time / 1e6:>14.2f}{n_chars / new_time / 1e6:>14.2f}{legacy_time / new_time:>10.1f}x"
+    )
+
+
+def main():
+    rng = random.Random(0)
+    mixed_texts = [make_mixed_text(rng, rng.randint(0, 300)) for _ in range(20000)]
+    cjk_texts = [make_cjk_text(rng, 200) for _ in range(2000)]
+    corpus_texts = read_corpus(sys.argv[1]) if len(sys.argv) > 1 else []
+
+    # 两种实现的结果必须一致
+    for name, texts in [("混合文本", mixed_texts), ("中文文本", cjk_texts), ("语料库", corpus_texts)]:
+        if texts:
+            mismatches = check_same(texts)
+            print(f"{name}：{len(texts)}篇，不一致{mismatches}篇")
+            assert mismatches == 0
+
+    print(f"{'语料':>10}{'篇数':>8}{'百万字':>10}{'原实现(M字/s)':>14}{'新实现(M字/s)':>14}{'加速':>10}")
+    bench("混合文本", mixed_texts)
+    bench("中文文本", cjk_texts)
+    if corpus_texts:
+        bench("语料库", corpus_texts)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,18 @@
-import pandas as pd
 import os
+import CoLibFormat
+import CoGenExport
+import CoGenJoin
 
 
-def filter_pairs(csv_file_path, txt_file_path):
+def filter_pairs(csv_file_path, txt_file_path, mode='include'):
     '''
-    读取txt文件，筛选只在txt文件中存在的数据行
+    读取txt文件，筛选只在txt文件中存在的数据行（mode为'exclude'时筛选不在txt文件中的数据行）
     '''
-    # 读取txt文件并将每一对词语存储在一个集合中
-    pairs = set()
-    with open(txt_file_path, 'r', encoding='utf-8') as txt_file:
-        for line in txt_file:
-            word1, word2 = line.strip().split('，')  # 注意这里使用的是中文逗号
-            pairs.add((word1, word2))
-    
-    # 读取csv文件
-    df = pd.read_csv(csv_file_path)
-    
-    # 筛选出只在pairs集合中存在的数据行
-    filtered_df = df[df.apply(lambda row: (row['词语1'], row['词语2']) in pairs, axis=1)]
-    
-    return filtered_df
+    # 读取txt文件中的词语对，注意这里使用的是中文逗号
+    pairs = CoGenJoin.read_pairs(txt_file_path, separator='，')
+
+    # 分块读取csv或colib格式的库文件，按(词语1, 词语2)哈希连接筛选
+    return CoGenJoin.filter_library(csv_file_path, CoGenJoin.pair_index(pairs), mode=mode)
 
 
 
@@ -28,11 +21,11 @@ def filter_keywords(csv_path, n, txt_output_path):
     过滤关键词库中词频大于等于n的条目并且存储为txt
     '''
 
-    data = pd.read_csv(csv_path)
+    data = CoLibFormat.load_library(csv_path)
     
     filtered_data = data[data['词频'] >= n]
 
-    filtered_data.to_csv(txt_output_path, sep='\t', index=False, header=True)
+    CoGenExport.write_csv(filtered_data, txt_output_path, encoding='utf-8', sep='\t')
 
 
 
@@ -46,8 +39,8 @@ def main():
 
     
     filtered_data = filter_pairs(csv_file_path, txt_file_path)
-    #存储结果为csv文件
-    filtered_data.to_csv( r'/home/xt/workplace/hwzt/res/keywords/wordsLibrary_94w.csv' , index=False)
+    #存储结果，格式由配置文件中的library_format决定
+    CoLibFormat.save_library(filtered_data, r'/home/xt/workplace/hwzt/res/keywords/wordsLibrary_94w')
 
 
 if __name__ == "__main__":
@@ -1,5 +1,8 @@
 import os
 import CoGenConfig as myconfig
+import CoLibFormat
+import CoGenExport
+import CoGenPinyinCache
 import pandas as pd
 from tqdm import tqdm
 from datetime import datetime
@@ -39,9 +42,7 @@ def merge_and_sort_txt_files(file1_path, file2_path, output_file_path):
     sorted_words = sorted(words)
 
     # 将排序后的词语写入到新的文件
-    with open(output_file_path, "w", encoding="utf-8") as output_file:
-        for word in sorted_words:
-            output_file.write(word + "\n")
+    CoGenExport.write_lines(sorted_words, output_file_path, compression=myconfig.txt_compression)
 
 
 def is_all_chinese(s):
@@ -49,140 +50,141 @@ def is_all_chinese(s):
     return all("\u4e00" <= char <= "\u9fff" for char in s)
 
 
-def filter_keywords(csv_path, txt_path, output_path, n_values, blacklist):
-    '''
-    
-    '''
-    # 读取CSV文件
-    df = pd.read_csv(csv_path)
+def load_keywords(csv_path, blacklist):
+    """
+    读取关键词库，删除黑名单中的词性和非中文关键词后按关键词合并词频。
+
+    :return: (原始关键词库, 合并后列为关键词、词频的dataframe)
+    """
+    original_df = CoLibFormat.load_library(csv_path)
 
     # 删除黑名单中的词性
-    df = df[~df["词性"].isin(blacklist)]
+    df = original_df[~original_df["词性"].isin(blacklist)]
 
     # 删除非中文关键词
-    df = df[df["关键词"].apply(is_all_chinese)] 
+    df = df[df["关键词"].apply(is_all_chinese)]
 
     # 合并关键词并计算词频
     df = df.groupby("关键词")["词频"].sum().reset_index()
+    return original_df, df
 
-    # 读取词语库
-    with open(txt_path, "r", encoding="utf-8") as file:
-        words_set = set(line.strip() for line in file)
-
-    for n in n_values:
-        # 根据阈值n过滤数据
-        filtered_df = df[df["词频"] >= n]
-
-        # 取出不在词语库中的关键词
-        final_words = filtered_df[~filtered_df["关键词"].isin(words_set)]["关键词"]
-
-        final_words=sorted(final_words)
 
-        # 输出结果到txt文件
-        with open(
-            os.path.join(output_path, f"keywords_result_threshold_{n}.txt"),
-            "w",
-            encoding="utf-8",
-        ) as file:
-            for word in final_words:
-                file.write(f"{word}\n")
+def read_words(txt_path):
+    """读取词语库，每行一个词语。"""
+    with open(txt_path, "r", encoding="utf-8") as file:
+        return set(line.strip() for line in file)
 
 
-def filter_keywords_include_origin(csv_path, txt_path, output_path, n_values, blacklist):
-    # 读取CSV文件
-    df = pd.read_csv(csv_path)
+def pinyin_keys(words, separator="", cache=None):
+    """
+    对每个不同的词语只计算一次拼音，返回{词语: 拼音排序键}，排序键为各字拼音以separator连接。
+    separator为"\x00"时，排序键的字符串顺序与按lazy_pinyin列表比较的顺序一致。
+    cache为拼音缓存（可选），已缓存的词语直接查表，不再转换拼音。
+    """
+    if cache is not None:
+        return cache.keys(words, separator)
+    return {word: separator.join(lazy_pinyin(word)) for word in set(words)}
 
-    # 删除黑名单中的词性
-    df = df[~df["词性"].isin(blacklist)]
 
-    # 删除非中文关键词
-    df = df[df["关键词"].apply(is_all_chinese)] 
+def threshold_views(df, freq_column, n_values):
+    """
+    df已按输出顺序排好，依次返回(阈值n, 词频大于等于n的行)。
+    排序和拼音计算都只在df上做一次，每个阈值只需一次向量化比较，阈值个数几乎不影响耗时。
+    """
+    freq = df[freq_column].to_numpy()
+    for n in n_values:
+        yield n, df[freq >= n]
 
-    # 合并关键词并计算词频
-    df = df.groupby("关键词")["词频"].sum().reset_index()
 
-    # 读取词语库
-    with open(txt_path, "r", encoding="utf-8") as file:
-        words_from_txt = set(line.strip() for line in file)
+def filter_keywords(csv_path, txt_path, output_path, n_values, blacklist):
+    '''
+    对每个阈值输出词频大于等于阈值、且不在词语库中的关键词，按字典顺序排列。
+    '''
+    _, df = load_keywords(csv_path, blacklist)
+    words_set = read_words(txt_path)
 
-    for n in n_values:
-        # 根据阈值n过滤数据
-        filtered_df = df[df["词频"] >= n]
+    # 取出不在词语库中的关键词，只排序一次
+    candidates = df[~df["关键词"].isin(words_set)].sort_values(by="关键词", ignore_index=True)
 
-        # 获取满足阈值的关键词
-        words_meeting_threshold = set(filtered_df["关键词"])
+    for n, filtered_df in threshold_views(candidates, "词频", n_values):
+        # 输出结果到txt文件
+        CoGenExport.write_lines(
+            filtered_df["关键词"].tolist(),
+            os.path.join(output_path, f"keywords_result_threshold_{n}.txt"),
+            compression=myconfig.txt_compression,
+        )
 
-        # 合并满足阈值的关键词和txt中的词语，并去重
-        final_words = sorted(words_meeting_threshold.union(words_from_txt), key=lambda x: lazy_pinyin(x))
 
+def filter_keywords_include_origin(csv_path, txt_path, output_path, n_values, blacklist, cache=None):
+    '''
+    对每个阈值输出词频大于等于阈值的关键词与词语库中词语的并集，按拼音排序。
+    '''
+    _, df = load_keywords(csv_path, blacklist)
+    words_from_txt = read_words(txt_path)
+
+    # 所有可能输出的词语只计算一次拼音、排序一次，拼音相同时按词语排序
+    keyword_freq = dict(zip(df["关键词"], df["词频"]))
+    keys = pinyin_keys(words_from_txt.union(keyword_freq), separator="\x00", cache=cache)
+    candidates = pd.DataFrame({"关键词": sorted(keys, key=lambda x: (keys[x], x))})
+    # 词语库中的词语在任何阈值下都会输出
+    candidates["词频"] = [
+        float("inf") if word in words_from_txt else keyword_freq[word]
+        for word in candidates["关键词"]
+    ]
+
+    for n, filtered_df in threshold_views(candidates, "词频", n_values):
         # 输出结果到txt文件
         output_file_path = os.path.join(output_path, f"combined_keywords_threshold_{n}.txt")
-        with open(output_file_path, "w", encoding="utf-8") as file:
-            for word in final_words:
-                file.write(f"{word}\n")
+        CoGenExport.write_lines(
+            filtered_df["关键词"].tolist(), output_file_path, compression=myconfig.txt_compression
+        )
 
 
-def filter_keywords_test(csv_path, txt_path, output_path, n_values, blacklist):
+def filter_keywords_test(csv_path, txt_path, output_path, n_values, blacklist, cache=None):
     '''
     输出文件拼音排序，并且输出被删除的部分。 
     '''
-    # 读取CSV文件
-    df = pd.read_csv(csv_path)
-
-    # 保存原始DataFrame为original_df
-    original_df = df.copy()
-
-    # 删除黑名单中的词性
-    df = df[~df["词性"].isin(blacklist)]
-
-    # 删除非中文关键词
-    df = df[df["关键词"].apply(is_all_chinese)] 
-
-    # 合并关键词并计算词频
-    df = df.groupby("关键词")["词频"].sum().reset_index()
-
-    # 读取词语库
-    with open(txt_path, "r", encoding="utf-8") as file:
-        words_set = set(line.strip() for line in file)
-
-    for n in n_values: 
-        # 根据阈值n过滤数据
-        filtered_df = df[df["词频"] >= n]
-
-        # 取出不在词语库中的关键词
-        final_df = filtered_df[~filtered_df["关键词"].isin(words_set)].copy()
-
-        # 添加一个拼音列用于排序
-        final_df['拼音'] = final_df['关键词'].apply(lambda x: ''.join(lazy_pinyin(x)))
-
-        # 按照中文拼音排序
-        final_df = final_df.sort_values(by="拼音")
-
-        # 输出结果到txt文件
-        with open(
+    original_df, df = load_keywords(csv_path, blacklist)
+    words_set = read_words(txt_path)
+
+    # 每个关键词只计算一次拼音
+    keys = pinyin_keys(original_df["关键词"], cache=cache)
+
+    # 不在词语库中的关键词，按照中文拼音排序，拼音相同时按关键词排序
+    final_df = df[~df["关键词"].isin(words_set)].copy()
+    final_df["拼音"] = final_df["关键词"].map(keys)
+    final_df = final_df.sort_values(by=["拼音", "关键词"], kind="stable")
+
+    # 原始关键词库的每一行附上其关键词合并后的词频，用于找出被过滤掉的词
+    original_df = original_df.copy()
+    original_df["拼音"] = original_df["关键词"].map(keys)
+    original_df["合并词频"] = original_df["关键词"].map(dict(zip(df["关键词"], df["词频"]))).fillna(0)
+    original_df = original_df.sort_values(by=["拼音", "关键词"], kind="stable")
+
+    final_views = threshold_views(final_df, "词频", n_values)
+    original_views = threshold_views(original_df, "词频", n_values)
+    for (n, filtered_df), (_, candidate_df) in zip(final_views, original_views):
+        # 输出结果到txt文件，每行为"关键词:词频"
+        CoGenExport.write_txt(
+            filtered_df,
             os.path.join(output_path, f"keywords_result_threshold_{n}.txt"),
-            "w",
-            encoding="utf-8",
-        ) as file:
-            for _, row in final_df.iterrows():
-                file.write(f"{row['关键词']}:{row['词频']}\n")
-
-        # 找出被过滤掉的词
-        filtered_out_df = original_df[~original_df["关键词"].isin(filtered_df["关键词"])]
-
-        filtered_out_df = filtered_out_df[filtered_out_df["词频"] >= n].copy()
-
-        # 添加一个拼音列用于排序
-        filtered_out_df['拼音'] = filtered_out_df['关键词'].apply(lambda x: ''.join(lazy_pinyin(x)))
+            ["关键词", "词频"],
+            [":"],
+            compression=myconfig.txt_compression,
+        )
 
-        # 按照中文拼音排序
-        filtered_out_df = filtered_out_df.sort_values(by="拼音")
+        # 找出被过滤掉的词：原始词频大于等于n，但合并后的词频不满足阈值（或被黑名单、非中文规则删除）
+        filtered_out_df = candidate_df[candidate_df["合并词频"] < n]
 
         # 输出被过滤掉的词到txt文件
         filtered_out_file_path = os.path.join(output_path, f"filtered_out_words_threshold_{n}.txt")
-        with open(filtered_out_file_path, "w", encoding="utf-8") as file:
-            for _, row in filtered_out_df.iterrows():
-                file.write(f"{row['关键词']}:{row['词频']}\n")
+        CoGenExport.write_txt(
+            filtered_out_df,
+            filtered_out_file_path,
+            ["关键词", "词频"],
+            [":"],
+            compression=myconfig.txt_compression,
+        )
 
 
 
@@ -199,7 +201,13 @@ def main():
     # print("")
     print(f"{csv_path}开始处理。已有关键词库为：{txt_path},输出地址为：{output_path}。")
     print(f"当前阈值为：{n_values}，当前词性黑名单为：{blacklist}。")
-    filter_keywords_include_origin(csv_path, txt_path, output_path, n_values, blacklist)
+    cache = None
+    if myconfig.pinyin_cache_path_WFLibProcessing:
+        cache = CoGenPinyinCache.PinyinCache(myconfig.pinyin_cache_path_WFLibProcessing)
+    filter_keywords_include_origin(csv_path, txt_path, output_path, n_values, blacklist, cache)
+    if cache is not None:
+        print(cache.report())
+        cache.close()
 
     # 时间戳
     timestamp = datetime.now().strftime("%m%d%H%M")
@@ -3,10 +3,12 @@ from tqdm import tqdm
 import os
 from datetime import datetime
 import cProfile
-import json
 import gc
 import re
 import CoGenConfig as myconfig
+import CoGenVocab
+import CoLibFormat
+import CoGenCorpusIO
 
 # 定义两种情况的属性列
 full_columns = myconfig.words_full_columns
@@ -69,21 +71,21 @@ def mergeLibrary(df1, df2):
 
 
 
-def corpus_process_and_merge(
-    corpus_of_Json_folders, word_Freq_Library_folder, existed_wordFreqLibrary, need_pos
-):
-    """处理多层文件夹下的语料库，注意文件夹层级"""
-    datacolumns = full_columns  # 这里假设 full_columns 已经被定义
+def newWordFreqCounter(vocab=None):
+    """新建以int32编号为键的计数器来存放（词，词性）组，只在保存时解码为dataframe"""
+    if vocab is None:
+        vocab = CoGenVocab.CoGenVocab()
+    return CoGenVocab.IdCounter(vocab, partial_columns, "词频")
 
-    # 尝试读取已有的关键词库，仅在函数开始时执行一次
-    wordFreqLibrary_to_be_added = pd.DataFrame(columns=datacolumns)  # 初始化新关键词库
+
+def loadExistedLibrary(wordFreqCounter, existed_wordFreqLibrary):
+    """读取已有的关键词库并计入计数器"""
+    datacolumns = full_columns
     try:
-        wordFreqLibrary_existed = pd.read_csv(existed_wordFreqLibrary)
+        wordFreqLibrary_existed = CoLibFormat.load_library(existed_wordFreqLibrary)
         print(f"正在将已有关键词库{existed_wordFreqLibrary}读入内存。")
-        if list(wordFreqLibrary_to_be_added.columns) == list(
-            wordFreqLibrary_existed.columns
-        ):
-            wordFreqLibrary_to_be_added = wordFreqLibrary_existed
+        if list(datacolumns) == list(wordFreqLibrary_existed.columns):
+            wordFreqCounter.add_frame(wordFreqLibrary_existed)
             wordFreqLibrary_existed = None
             gc.collect()
         else:
@@ -94,13 +96,75 @@ def corpus_process_and_merge(
     except Exception as e:
         print(f"错误：读取已有关键词库{existed_wordFreqLibrary}时出现问题，问题如下：{str(e)}")
 
+
+def articleProcess(wordFreqCounter, article_file, article_content, need_pos):
+    """统计一篇文章的关键词并计入计数器"""
+    try:
+        articleCollocation = readArticle_fromJSP(article_content, need_pos)
+        # 将文章的（词，词性）组计入计数器
+        wordFreqCounter.add_frame(articleCollocation)
+    except MemoryError:
+        print(f"内存错误：处理文件 '{article_file}' 时内存不足。")
+    except Exception as e:
+        print(f"错误：处理文件 '{article_file}' 时出现问题。{str(e)}")
+
+
+def saveTempLibrary(wordFreqCounter, word_Freq_Library_folder, folder1):
+    """暂时保存当前结果，返回保存的路径（每次保存都是新文件），保存失败时返回None"""
+    #print(f"开始保存截止至 '{folder1}'(包含) 的处理结果")
+    temp_path = None
+    try:
+        wordFreqLibrary_new = wordFreqCounter.to_frame()
+        timestamp = datetime.now().strftime("%m%d%H%M")
+        temp_path = CoLibFormat.save_library(
+            wordFreqLibrary_new,
+            # 同一分钟内的多次保存使用不同的文件，不覆盖运行日志仍在引用的临时结果
+            CoLibFormat.unique_path_base(
+                os.path.join(word_Freq_Library_folder, f"wordFreqLibrary-temp-{timestamp}")
+            ),
+            sort_by="词频",
+        )
+        wordFreqCounter.vocab.save(word_Freq_Library_folder)
+        #print(f"截止 '{folder1}' 的处理结果已保存至wordFreqLibrary-temp-{timestamp}.csv")
+    except Exception as e:
+        print(f"错误：保存截止 '{folder1}' 的结果时出现问题。{str(e)}")
+        temp_path = None
+    wordFreqLibrary_new = None
+    gc.collect()
+    return temp_path
+
+
+def saveLibrary(wordFreqCounter, word_Freq_Library_folder):
+    """保存所有处理结果，返回保存的路径"""
+    print(f"开始保存所有的处理结果")
+    wordFreqLibrary_new = wordFreqCounter.to_frame()
+    timestamp = datetime.now().strftime("%m%d%H%M")
+    result_path = CoLibFormat.save_library(
+        wordFreqLibrary_new,
+        os.path.join(word_Freq_Library_folder, f"wordFreqLibrary-{timestamp}"),
+        sort_by="词频",
+    )
+    wordFreqCounter.vocab.save(word_Freq_Library_folder)
+    return result_path
+
+
+def corpus_process_and_merge(
+    corpus_of_Json_folders, word_Freq_Library_folder, existed_wordFreqLibrary, need_pos
+):
+    """处理多层文件夹下的语料库，注意文件夹层级"""
+    # 初始化以int32编号为键的计数器来存放（词，词性）组，只在保存时解码为dataframe
+    wordFreqCounter = newWordFreqCounter(CoGenVocab.load_vocab(word_Freq_Library_folder))
+
+    # 尝试读取已有的关键词库，仅在函数开始时执行一次
+    loadExistedLibrary(wordFreqCounter, existed_wordFreqLibrary)
+
     # 检查输出文件夹是否存在，如果不存在则创建
     if not os.path.exists(word_Freq_Library_folder):
         os.makedirs(word_Freq_Library_folder)
 
-    # 为每个JSON文件夹地址创建一个外部进度条
-    pbar0 = tqdm(corpus_of_Json_folders, desc="总体进度")
-    for corpus_of_Json_folder in pbar0:
+    # 先列出全部待处理的文件夹：[(语料文件夹, [(folder1, [(folder2路径, 文章列表), ...]), ...]), ...]
+    plan = []
+    for corpus_of_Json_folder in corpus_of_Json_folders:
         if not os.path.exists(corpus_of_Json_folder):
             print(f"错误：指定的文件夹 {corpus_of_Json_folder} 不存在。")
             continue
@@ -109,84 +173,48 @@ def corpus_process_and_merge(
         folder1_list = os.listdir(corpus_of_Json_folder)
         folder1_list = sorted(folder1_list)  # 按照文件夹名字升序排序
 
-        # 使用外部进度条处理folder1
-        pbar1 = tqdm(folder1_list, desc=f"正在处理 {corpus_of_Json_folder} 中的文件夹", leave=False)
-        for folder1 in pbar1:
+        folder1_units = []
+        for folder1 in folder1_list:
             folder1_path = os.path.join(corpus_of_Json_folder, folder1)
             folder2_list = os.listdir(folder1_path)
             folder2_list = sorted(folder2_list)  # 按照文件夹名字升序排序
+            folder2_paths = [os.path.join(folder1_path, folder2) for folder2 in folder2_list]
+            folder1_units.append((folder1, [(path, os.listdir(path)) for path in folder2_paths]))
+        plan.append((corpus_of_Json_folder, folder1_units))
+
+    # 使用后台预读的读取器，按同样的顺序连续读取全部文件夹
+    reader = CoGenCorpusIO.make_reader()
+    if reader is not None:
+        reader.schedule(
+            unit
+            for _, folder1_units in plan
+            for _, folder2_units in folder1_units
+            for unit in folder2_units
+        )
 
+    # 为每个JSON文件夹地址创建一个外部进度条
+    pbar0 = tqdm(plan, desc="总体进度")
+    for corpus_of_Json_folder, folder1_units in pbar0:
+        # 使用外部进度条处理folder1
+        pbar1 = tqdm(folder1_units, desc=f"正在处理 {corpus_of_Json_folder} 中的文件夹", leave=False)
+        for folder1, folder2_units in pbar1:
             # 遍历folder1中的folder2
-            for folder2 in folder2_list:
-                folder2_path = os.path.join(folder1_path, folder2)
-                article_list = os.listdir(folder2_path)
-
-                # 初始化一个空的dataframe来存放folder2的（词，词性）组
-                folder2_Library_to_be_added = pd.DataFrame(columns=full_columns)
-
-                # 遍历folder2中的每篇文章
-                for article_file in article_list:
-                    if not article_file.endswith(".json"):
-                        print(f"警告：文件 '{article_file}' 不是json格式，已跳过。")
-                        continue
-
-                    file_path = os.path.join(folder2_path, article_file)
-
-                    # 读取和处理文件
-                    try:
-                        with open(file_path, "r", encoding="utf-8") as f:
-                            article_content = json.load(f)
-                            # 假设 readArticle_fromJSP 和 mergeLibrary 已被定义
-                            articleCollocation = readArticle_fromJSP(
-                                article_content, need_pos
-                            )
-                            folder2_Library_to_be_added = mergeLibrary(
-                                folder2_Library_to_be_added, articleCollocation
-                            )
-                    except MemoryError:
-                        print(f"内存错误：处理文件 '{article_file}' 时内存不足。")
-                    except Exception as e:
-                        print(f"错误：处理文件 '{article_file}' 时出现问题。{str(e)}")
-
-                # 合并folder1的结果
-                try:
-                    wordFreqLibrary_to_be_added = mergeLibrary(
-                        wordFreqLibrary_to_be_added, folder2_Library_to_be_added
-                    )
-                except MemoryError:
-                    print(f"内存错误：合并folder1 '{folder1}' 的（词，词性）组时内存不足。")
-                    continue
+            for folder2_path, article_list in folder2_units:
+                # 遍历folder2中的每篇文章，json与jsonl分片都按顺序流式读取
+                for article_file, article_content in CoGenCorpusIO.open_articles(
+                    folder2_path, article_list, reader
+                ):
+                    articleProcess(wordFreqCounter, article_file, article_content, need_pos)
 
             # 暂时保存当前结果
-            wordFreqLibrary_new = wordFreqLibrary_to_be_added
-            #print(f"开始保存截止至 '{folder1}'(包含) 的处理结果")
-            try:
-                timestamp = datetime.now().strftime("%m%d%H%M")
-                wordFreqLibrary_new = wordFreqLibrary_new.sort_values(by="词频", ascending=False)
-                wordFreqLibrary_new.to_csv(
-                    os.path.join(
-                        word_Freq_Library_folder,
-                        f"wordFreqLibrary-temp-{timestamp}.csv",
-                    ),
-                    index=False,
-                    encoding="utf-8-sig",
-                )
-                #print(f"截止 '{folder1}' 的处理结果已保存至wordFreqLibrary-temp-{timestamp}.csv")
-            except Exception as e:
-                print(f"错误：保存截止 '{folder1}' 的结果时出现问题。{str(e)}")
-            wordFreqLibrary_new = None
-            gc.collect()
+            saveTempLibrary(wordFreqCounter, word_Freq_Library_folder, folder1)
+
+    if reader is not None:
+        print(reader.report())
+        reader.close()
 
     # 保存所有处理结果的代码
-    print(f"开始保存所有的处理结果")
-    wordFreqLibrary_new = wordFreqLibrary_to_be_added
-    timestamp = datetime.now().strftime("%m%d%H%M")
-    wordFreqLibrary_new = wordFreqLibrary_new.sort_values(by="词频", ascending=False)
-    wordFreqLibrary_new.to_csv(
-        os.path.join(word_Freq_Library_folder, f"wordFreqLibrary-{timestamp}.csv"),
-        index=False,
-        encoding="utf-8-sig",
-    )
+    saveLibrary(wordFreqCounter, word_Freq_Library_folder)
 
 
 